@@ -1,10 +1,18 @@
 import streamlit as st
-from claim_validation import validate_claim, get_policy_holder
-from genai_module import get_genai_response, get_claim_guidance
-from vision_module import analyze_image
+from claim_validation import get_policy_holder, ClaimStatus, RULE_ENGINE
+from genai_module import get_claim_guidance
+from claim_queue import get_processor
+from claim_store import get_store
+from claim_stats import get_stats
+from duplicate_index import get_duplicate_index
+from image_hash_index import get_image_index
+import model_registry
+import metrics
 import os
+import hmac
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import pandas as pd
 
 # Page configuration
@@ -15,6 +23,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Optionally load the vision and language models in the background so the
+# first submission doesn't wait for them. Other pages never touch torch.
+if os.environ.get("PREWARM_MODELS", "").lower() in ("1", "true", "yes"):
+    model_registry.prewarm(modules=["vision_module", "genai_module"])
+
+# Serve /metrics for a Prometheus scraper (once per process)
+if metrics.ENABLED and os.environ.get("METRICS_PORT"):
+    metrics.start_http_server(int(os.environ["METRICS_PORT"]))
+
 # Enhanced CSS styling
 st.markdown("""
     <style>
@@ -121,13 +138,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
-if 'claim_history' not in st.session_state:
-    st.session_state.claim_history = []
 if 'current_step' not in st.session_state:
     st.session_state.current_step = 1
 if 'claim_data' not in st.session_state:
     st.session_state.claim_data = {}
 
+# Claim history lives in a shared SQLite store, not in the session
+claim_store = get_store()
+claim_stats = get_stats(claim_store)
+duplicate_index = get_duplicate_index(claim_store)
+image_index = get_image_index(claim_store)
+
 # Sidebar
 with st.sidebar:
     st.markdown("## 🛡️ Insurance AI Agent")
@@ -148,19 +169,23 @@ with st.sidebar:
     with col1:
         st.markdown(f"""
         <div class="metric-card">
-            <div class="metric-value">{len(st.session_state.claim_history)}</div>
+            <div class="metric-value">{claim_stats.total}</div>
             <div class="metric-label">Total Claims</div>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
-        approved_claims = sum(1 for claim in st.session_state.claim_history if "✅" in claim.get('status', ''))
+        approved_claims = claim_stats.count(ClaimStatus.APPROVED.value)
         st.markdown(f"""
         <div class="metric-card">
             <div class="metric-value">{approved_claims}</div>
             <div class="metric-label">Approved</div>
         </div>
         """, unsafe_allow_html=True)
+    
+    approval_24h = claim_stats.window_rates(ClaimStatus.APPROVED.value)["24h"]
+    if approval_24h["claims"]:
+        st.caption(f"Approval rate (24h): {approval_24h['rate']:.0%} of {approval_24h['claims']} claims")
 
 # Main content based on navigation
 if page == "📝 New Claim":
@@ -219,6 +244,78 @@ if page == "📝 New Claim":
 
     st.markdown("---")
     
+    # Results of the last submitted claim, filled in as the background workers finish
+    if st.session_state.get('active_claim'):
+        active_claim = st.session_state.active_claim
+        job = get_processor().get_job(active_claim['claim_id'])
+        
+        if job is None:
+            del st.session_state.active_claim
+        else:
+            st.markdown('<div class="success-card">', unsafe_allow_html=True)
+            st.markdown(f"### 🎉 Claim {job['claim_id']} Submitted Successfully!")
+            if job['validation'] is None:
+                st.info("⏳ Validating claim...")
+            else:
+                st.write(f"**Validation Result:** {job['validation']}")
+            guidance_slot = None
+            if job['ai_guidance'] is not None:
+                st.write(f"**AI Guidance:** {job['ai_guidance']}")
+            else:
+                # Generated text streams into this slot below; the templated next steps show right away
+                st.write("**AI Guidance:**")
+                guidance_slot = st.empty()
+                st.markdown(job['guidance_next_steps'])
+            st.markdown('</div>', unsafe_allow_html=True)
+            
+            # Image analysis if files uploaded
+            if job['images']:
+                st.markdown('<div class="info-card">', unsafe_allow_html=True)
+                st.markdown("### 📷 Document Analysis")
+                
+                for file_name, image_result in job['images']:
+                    if image_result is None:
+                        st.info(f"⏳ Analyzing {file_name}...")
+                        continue
+                    image_feedback, debug_messages = image_result
+                    if image_feedback.startswith("🔁"):
+                        st.warning(f"**Analysis Result:** {image_feedback}")
+                    else:
+                        st.success(f"**Analysis Result:** {image_feedback}")
+                    
+                    with st.expander("🔍 Technical Details", expanded=False):
+                        for msg in debug_messages:
+                            st.write(msg)
+                
+                st.markdown('</div>', unsafe_allow_html=True)
+            
+            for error in job['errors']:
+                st.error(error)
+            
+            # Stream the guidance once the rest of the panel is on screen, then refresh the job
+            if guidance_slot is not None:
+                with guidance_slot.container():
+                    st.write_stream(get_processor().stream_guidance(job['claim_id']))
+                job = get_processor().get_job(job['claim_id']) or job
+            
+            # The claim processor records the claim in the history; this panel only displays it
+            finished = job['status'] in ("done", "failed")
+            if job['duplicates']:
+                similar = ", ".join(f"{claim_id} ({similarity:.0%})" for claim_id, similarity in job['duplicates'])
+                st.warning(f"🔁 This description closely matches earlier claims: {similar}")
+            
+            if finished:
+                st.success("✅ Claim processed! You can start a new claim or view your claim history.")
+                if st.button("Dismiss", key="dismiss_claim"):
+                    del st.session_state.active_claim
+                    st.rerun()
+            else:
+                # Poll for the next partial result without blocking on the work itself
+                time.sleep(0.5)
+                st.rerun()
+        
+        st.markdown("---")
+    
     # Progress indicator
     steps = ["Basic Info", "Claim Details", "Documentation", "Review & Submit"]
     progress = st.session_state.current_step / len(steps)
@@ -372,80 +469,82 @@ if page == "📝 New Claim":
         
         with col2:
             if st.button("Submit Claim", key="submit_claim"):
-                # Process the claim
-                with st.spinner("Processing your claim..."):
-                    validation_result = validate_claim(
-                        st.session_state.claim_data['insurance_type'],
-                        st.session_state.claim_data['policy_number'],
-                        st.session_state.claim_data['description']
-                    )
-                    
-                    ai_response = get_genai_response(
-                        st.session_state.claim_data['insurance_type'],
-                        st.session_state.claim_data['description']
-                    )
+                claim_data = st.session_state.claim_data
+                uploaded_files = claim_data.get('uploaded_files') or []
+                image_files = [file for file in uploaded_files if file.type.startswith('image')]
+                pdf_files = [file for file in uploaded_files if file.type == 'application/pdf']
                 
-                # Store claim in history
-                claim_record = {
-                    'timestamp': datetime.now().isoformat(),
-                    'name': st.session_state.claim_data['name'],
-                    'policy_number': st.session_state.claim_data['policy_number'],
-                    'insurance_type': st.session_state.claim_data['insurance_type'],
-                    'description': st.session_state.claim_data['description'],
-                    'status': validation_result,
-                    'ai_guidance': ai_response,
-                    'documents': len(st.session_state.claim_data.get('uploaded_files', []))
-                }
-                st.session_state.claim_history.append(claim_record)
-                
-                # Display results
-                st.markdown('<div class="success-card">', unsafe_allow_html=True)
-                st.markdown("### 🎉 Claim Submitted Successfully!")
-                st.write(f"**Validation Result:** {validation_result}")
-                st.write(f"**AI Guidance:** {ai_response}")
-                st.markdown('</div>', unsafe_allow_html=True)
-                
-                # Image analysis if files uploaded
-                if st.session_state.claim_data.get('uploaded_files'):
-                    st.markdown('<div class="info-card">', unsafe_allow_html=True)
-                    st.markdown("### 📷 Document Analysis")
-                    
-                    for file in st.session_state.claim_data['uploaded_files']:
-                        if file.type.startswith('image'):
-                            image_feedback, debug_messages = analyze_image(
-                                file, 
-                                st.session_state.claim_data['insurance_type']
-                            )
-                            st.success(f"**Analysis Result:** {image_feedback}")
-                            
-                            with st.expander("🔍 Technical Details", expanded=False):
-                                for msg in debug_messages:
-                                    st.write(msg)
-                    
-                    st.markdown('</div>', unsafe_allow_html=True)
+                # Queue the claim; validation and analysis run in the background
+                with metrics.span("app.submit"):
+                    claim_id = get_processor().submit(
+                        claim_data['insurance_type'],
+                        claim_data['policy_number'],
+                        claim_data['description'],
+                        image_files,
+                        pdf_files,
+                        name=claim_data['name']
+                    )
+                st.session_state.active_claim = {'claim_id': claim_id}
                 
                 # Reset for new claim
                 st.session_state.current_step = 1
                 st.session_state.claim_data = {}
-                
-                st.success("✅ Claim processed! You can start a new claim or view your claim history.")
+                st.rerun()
         
         st.markdown('</div>', unsafe_allow_html=True)
 
 elif page == "📊 Claim History":
     st.markdown("## 📊 Claim History")
     
-    if not st.session_state.claim_history:
+    if not claim_store.count():
         st.info("No claims submitted yet. Start by filing a new claim!")
     else:
-        # Convert to DataFrame for better display
-        df = pd.DataFrame(st.session_state.claim_history)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp', ascending=False)
+        # Totals per status come from the running counters, not from the history
+        status_columns = st.columns(len(ClaimStatus))
+        for column, status in zip(status_columns, ClaimStatus):
+            column.metric(status.label, claim_stats.count(status.value))
+        
+        # Filters are applied in the database, so only one page is ever loaded
+        col1, col2, col3, col4 = st.columns([1, 1, 2, 1])
+        with col1:
+            type_filter = st.selectbox("Insurance Type", ["All", "Auto", "Home", "Health"])
+        with col2:
+            status_filter = st.selectbox(
+                "Status", [None] + list(ClaimStatus),
+                format_func=lambda status: "All" if status is None else status.label
+            )
+        with col3:
+            date_range = st.date_input("Date Range", value=())
+        with col4:
+            page_size = st.selectbox("Per Page", [10, 20, 50, 100], index=1)
+        
+        filters = {
+            'insurance_type': None if type_filter == "All" else type_filter,
+            'status': status_filter.value if status_filter else None,
+        }
+        if len(date_range) == 2:
+            filters['since'] = date_range[0].isoformat()
+            filters['until'] = (date_range[1] + timedelta(days=1)).isoformat()
+        
+        total_claims = claim_store.count(**filters)
+        total_pages = max((total_claims + page_size - 1) // page_size, 1)
+        # Keyed on the filters so the page resets to 1 whenever they change
+        page_number = st.number_input(
+            "Page", min_value=1, max_value=total_pages, value=1, step=1,
+            key=f"history_page_{sorted(filters.items())}_{page_size}"
+        )
+        st.caption(f"Page {page_number} of {total_pages} ({total_claims} claims)")
+        claims = claim_store.query(page=page_number, page_size=page_size, summary=True, **filters)
+        
+        if not claims:
+            st.info("No claims match the selected filters.")
         
         # Display claims
-        for _, claim in df.iterrows():
-            status_color = "success-card" if "✅" in claim['status'] else "warning-card" if "⚠️" in claim['status'] else "error-card"
+        for claim in claims:
+            status_color = {
+                ClaimStatus.APPROVED.value: "success-card",
+                ClaimStatus.PENDING_REVIEW.value: "warning-card",
+            }.get(claim['status_code'], "error-card")
             
             st.markdown(f'<div class="{status_color}">', unsafe_allow_html=True)
             col1, col2 = st.columns([2, 1])
@@ -454,21 +553,17 @@ elif page == "📊 Claim History":
                 st.markdown(f"**{claim['insurance_type']} Claim** - {claim['name']}")
                 st.write(f"**Policy:** {claim['policy_number']}")
                 st.write(f"**Status:** {claim['status']}")
-                st.write(f"**Description:** {claim['description'][:100]}...")
+                st.write(f"**Description:** {claim['description_preview']}...")
+                if claim['duplicate_of']:
+                    st.write(f"**🔁 Similar to:** {claim['duplicate_of']}")
             
             with col2:
-                # Convert string timestamp to datetime for proper formatting
-                timestamp_str = claim['timestamp']
-                if isinstance(timestamp_str, str):
-                    from datetime import datetime
-                    timestamp_dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    st.write(f"**Date:** {timestamp_dt.strftime('%Y-%m-%d %H:%M')}")
-                else:
-                    st.write(f"**Date:** {timestamp_str}")
+                st.write(f"**Date:** {claim['date']}")
                 st.write(f"**Documents:** {claim['documents']} files")
             
-            with st.expander("AI Guidance", expanded=False):
-                st.write(claim['ai_guidance'])
+            # AI guidance is only loaded for claims the user opens
+            if st.checkbox("Show AI Guidance", key=f"guidance_{claim['claim_id']}"):
+                st.write(claim_store.get_guidance(claim['claim_id']))
             
             st.markdown('</div>', unsafe_allow_html=True)
 
@@ -486,15 +581,29 @@ elif page == "⚙️ Settings":
     
     st.markdown("### 🔧 Application Settings")
     
-    # Clear claim history
-    if st.button("Clear Claim History"):
-        st.session_state.claim_history = []
-        st.success("Claim history cleared!")
+    # Clearing deletes the shared history of every user, so it is limited to
+    # administrators holding CLAIM_ADMIN_TOKEN and needs an explicit confirmation
+    admin_token = os.environ.get("CLAIM_ADMIN_TOKEN")
+    with st.expander("🗑️ Clear Claim History (administrators)"):
+        if not admin_token:
+            st.caption("Disabled. Set CLAIM_ADMIN_TOKEN to let administrators clear the shared claim history.")
+        else:
+            entered_token = st.text_input("Admin token", type="password", key="clear_history_token")
+            confirmed = st.checkbox("I understand this permanently deletes every user's claims", key="clear_history_confirm")
+            if st.button("Clear Claim History", disabled=not confirmed):
+                if hmac.compare_digest(entered_token.encode("utf-8"), admin_token.encode("utf-8")):
+                    claim_store.clear()
+                    claim_stats.reset()
+                    duplicate_index.clear()
+                    image_index.clear()
+                    st.success("Claim history cleared!")
+                else:
+                    st.error("Invalid admin token.")
     
     # Export data
-    if st.session_state.claim_history:
+    if claim_store.count():
         if st.button("Export Claim History"):
-            df = pd.DataFrame(st.session_state.claim_history)
+            df = claim_store.to_dataframe()
             csv = df.to_csv(index=False)
             st.download_button(
                 label="Download CSV",
@@ -504,8 +613,61 @@ elif page == "⚙️ Settings":
             )
     
     st.markdown("### 📊 System Information")
-    st.write(f"**Total Claims Processed:** {len(st.session_state.claim_history)}")
+    st.write(f"**Total Claims Processed:** {claim_store.count()}")
     st.write(f"**Current Session:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    st.markdown("### 📏 Validation Rules")
+    rule_stats = RULE_ENGINE.stats()
+    st.write(f"**Rules File:** {rule_stats['source']} (loaded {datetime.fromtimestamp(rule_stats['loaded_at']).strftime('%Y-%m-%d %H:%M:%S')}, {rule_stats['reloads']} reloads)")
+    if rule_stats['last_error']:
+        st.error(f"Rules file has errors; the previous rules are still in use: {rule_stats['last_error']}")
+    # Rules that never match are candidates for removal; matched but never deciding means they are shadowed
+    st.dataframe(pd.DataFrame(rule_stats['rules']), use_container_width=True, hide_index=True)
+    if rule_stats['timings']:
+        st.dataframe(pd.DataFrame.from_dict(rule_stats['timings'], orient="index").round(1), use_container_width=True)
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Reload Rules Now"):
+            if RULE_ENGINE.reload(force=True):
+                st.success("Rules reloaded!")
+            else:
+                st.error(f"Rules not reloaded: {RULE_ENGINE.last_error}")
+    with col2:
+        if st.button("Reset Rule Counters"):
+            RULE_ENGINE.reset_stats()
+            st.rerun()
+    
+    st.markdown("### 📈 Performance Metrics")
+    if not metrics.ENABLED:
+        st.info("Metrics are disabled. Set METRICS_ENABLED=1 to record per-stage timings.")
+    else:
+        snapshot = metrics.snapshot()
+        if snapshot["stages"]:
+            st.dataframe(
+                pd.DataFrame.from_dict(snapshot["stages"], orient="index").round(2),
+                use_container_width=True
+            )
+        else:
+            st.write("No timings recorded yet.")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.json({"counters": snapshot["counters"], "gauges": snapshot["gauges"]})
+        with col2:
+            st.download_button(
+                label="Download Prometheus Metrics",
+                data=metrics.to_prometheus(),
+                file_name="metrics.prom",
+                mime="text/plain"
+            )
+            st.download_button(
+                label="Download JSON Metrics",
+                data=metrics.to_json(),
+                file_name="metrics.json",
+                mime="application/json"
+            )
+            if st.button("Reset Metrics"):
+                metrics.reset()
+                st.rerun()
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,219 @@
+"""Local cache of model and label artifacts for the vision pipeline.
+
+Production nodes have no outbound network, so the ImageNet labels and model
+weights are read from a local artifact directory instead of being downloaded
+at startup. Each file is checked against the sha256 recorded in the directory's
+manifest.json; the hash is only recomputed when the file's size or mtime changes.
+
+Populate the directory once on a machine with network access:
+    python artifacts.py fetch
+and copy it to the target nodes (or point ARTIFACT_DIR at a shared location).
+Once the directory has a manifest nothing is downloaded at runtime: a missing
+artifact is an error straight away. Set OFFLINE=1 to forbid any download attempt.
+The directory may be read-only; manifest updates after a verified copy are
+best-effort.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", os.path.join(current_dir, "artifacts"))
+MANIFEST_FILE = "manifest.json"
+
+ARTIFACTS = {
+    "imagenet_labels": {
+        "file": "imagenet_classes.txt",
+        "url": "https://raw.githubusercontent.com/pytorch/hub/master/imagenet_classes.txt",
+    },
+    "resnet50": {
+        "file": "resnet50-0676ba61.pth",
+        "url": "https://download.pytorch.org/models/resnet50-0676ba61.pth",
+        # torchvision publishes the first 8 hex digits of the sha256 in the file name
+        "sha256_prefix": "0676ba61",
+    },
+    "resnet18": {
+        "file": "resnet18-f37072fd.pth",
+        "url": "https://download.pytorch.org/models/resnet18-f37072fd.pth",
+        "sha256_prefix": "f37072fd",
+    },
+    "mobilenet_v3_large": {
+        "file": "mobilenet_v3_large-8738ca79.pth",
+        "url": "https://download.pytorch.org/models/mobilenet_v3_large-8738ca79.pth",
+        "sha256_prefix": "8738ca79",
+    },
+}
+
+logger = logging.getLogger(__name__)
+
+_manifest_lock = threading.Lock()
+
+
+class ArtifactError(RuntimeError):
+    pass
+
+
+def is_offline():
+    return os.environ.get("OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def _manifest_path():
+    return os.path.join(ARTIFACT_DIR, MANIFEST_FILE)
+
+
+def _read_manifest():
+    try:
+        with open(_manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(manifest):
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    tmp_path = _manifest_path() + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, _manifest_path())
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_path(name):
+    return os.path.join(ARTIFACT_DIR, ARTIFACTS[name]["file"])
+
+
+def fetch(name, force=False):
+    """Download an artifact into the cache and record its checksum"""
+    if is_offline():
+        raise ArtifactError(f"Cannot download '{name}': OFFLINE is set")
+    import requests
+
+    spec = ARTIFACTS[name]
+    path = artifact_path(name)
+    if os.path.exists(path) and not force:
+        return verify(name, record=True)
+
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    tmp_path = path + ".part"
+    with requests.get(spec["url"], stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(tmp_path, "wb") as f:
+            for block in response.iter_content(1 << 20):
+                f.write(block)
+    os.replace(tmp_path, path)
+
+    # A fresh download replaces whatever checksum was recorded before
+    with _manifest_lock:
+        manifest = _read_manifest()
+        if manifest.pop(name, None) is not None:
+            _write_manifest(manifest)
+    return verify(name, record=True)
+
+
+def verify(name, record=False):
+    """Check an artifact against the manifest and return its path.
+
+    With record=True an artifact missing from the manifest is hashed and added
+    (used by fetch); otherwise an unrecorded artifact is an error.
+    """
+    spec = ARTIFACTS[name]
+    path = artifact_path(name)
+    if not os.path.exists(path):
+        raise ArtifactError(
+            f"Artifact '{name}' not found at {path}. Run 'python artifacts.py fetch' "
+            "on a machine with network access and copy the artifacts directory here."
+        )
+
+    stat = os.stat(path)
+    with _manifest_lock:
+        manifest = _read_manifest()
+        entry = manifest.get(name)
+
+        # Skip rehashing when the file hasn't changed since it was last verified
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return path
+
+        checksum = _sha256(path)
+        prefix = spec.get("sha256_prefix")
+        if prefix and not checksum.startswith(prefix):
+            raise ArtifactError(f"Checksum mismatch for '{name}': expected {prefix}..., got {checksum}")
+
+        if entry:
+            if entry["sha256"] != checksum:
+                raise ArtifactError(f"Checksum mismatch for '{name}': expected {entry['sha256']}, got {checksum}")
+        elif not record:
+            raise ArtifactError(f"Artifact '{name}' has no checksum in {_manifest_path()}")
+
+        manifest[name] = {"file": spec["file"], "sha256": checksum, "size": stat.st_size, "mtime": stat.st_mtime}
+        try:
+            _write_manifest(manifest)
+        except OSError as e:
+            if not entry:
+                raise
+            # Only the size/mtime cache is stale (e.g. a copied, read-only directory);
+            # the file matched its checksum, so it is rehashed next time instead
+            logger.warning("Could not update %s: %s", _manifest_path(), e)
+        return path
+
+
+def ensure(name):
+    """Return the verified local path of an artifact.
+
+    Downloads only into an artifact directory without a manifest, and never with
+    OFFLINE set; a populated directory is only verified, so a missing file fails
+    at once instead of waiting on the network.
+    """
+    if is_offline() or os.path.exists(_manifest_path()):
+        return verify(name)
+    # Downloads only if missing; otherwise just verifies and records the checksum
+    return fetch(name)
+
+
+def load_labels():
+    with open(ensure("imagenet_labels"), encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def load_state_dict(name):
+    """Load model weights memory-mapped from the artifact cache"""
+    import torch
+
+    path = ensure(name)
+    try:
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except TypeError:
+        # Older torch without mmap support
+        return torch.load(path, map_location="cpu")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "verify"
+    names = argv[1:] or list(ARTIFACTS)
+    if command not in ("fetch", "verify"):
+        print("Usage: python artifacts.py [fetch|verify] [name ...]", file=sys.stderr)
+        return 2
+
+    failed = False
+    for name in names:
+        try:
+            path = fetch(name) if command == "fetch" else verify(name)
+            print(f"✅ {name}: {path}")
+        except Exception as e:
+            print(f"❌ {name}: {e}", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Batch claim validation for large claim files.
+
+Reads claims from a CSV or JSONL file in chunks, validates each chunk against
+POLICIES on a pool of worker processes and appends the results to the output
+file as soon as each chunk finishes, so memory use stays flat no matter how big
+the input is. Each result row keeps the input columns and adds status_code (the
+ClaimStatus value) and status (the message shown in the UI).
+
+Usage:
+    python batch_validation.py claims.csv -o results.csv --workers 4 --chunksize 10000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+REQUIRED_COLUMNS = ["insurance_type", "policy_number", "description"]
+
+
+def _file_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    raise ValueError(f"Unsupported file type '{ext}'. Use .csv or .jsonl")
+
+
+def read_claims(path, chunksize=10000):
+    """Yield DataFrame chunks of claims from a CSV or JSONL file"""
+    if _file_format(path) == "csv":
+        # Read everything as text so policy numbers are parsed exactly like the UI input
+        reader = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+    else:
+        reader = pd.read_json(path, lines=True, dtype=False, chunksize=chunksize)
+
+    for chunk in reader:
+        missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+        if missing:
+            raise ValueError(f"Claims file is missing required columns: {', '.join(missing)}")
+        yield chunk
+
+
+def validate_chunk(chunk):
+    """Validate one chunk of claims; returns the chunk with 'status_code' and 'status' columns added"""
+    from claim_validation import validate_claims_status
+
+    claims = chunk[REQUIRED_COLUMNS].astype(object).where(chunk[REQUIRED_COLUMNS].notna(), "")
+    results = validate_claims_status(
+        claims["insurance_type"].astype(str),
+        claims["policy_number"],
+        claims["description"].astype(str),
+    )
+    chunk = chunk.copy()
+    chunk["status_code"] = [status.value for status, _ in results]
+    chunk["status"] = [message for _, message in results]
+    return chunk
+
+
+class ResultWriter:
+    """Appends result chunks to a CSV or JSONL file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = _file_format(path)
+        self.rows = 0
+        self._file = open(path, "w", encoding="utf-8", newline="")
+
+    def write(self, chunk):
+        if self.format == "csv":
+            chunk.to_csv(self._file, index=False, header=self.rows == 0)
+        else:
+            if not chunk.empty:
+                lines = chunk.to_json(orient="records", lines=True, force_ascii=False)
+                self._file.write(lines.rstrip("\n") + "\n")
+        self._file.flush()
+        self.rows += len(chunk)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_batch(input_path, output_path, workers=None, chunksize=10000, progress=None):
+    """Validate every claim in input_path and write results to output_path.
+
+    At most two chunks per worker are in flight at once, so memory is bounded by
+    chunksize * workers rather than by the file size. Output order matches input order.
+    Returns the number of claims written.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    with ResultWriter(output_path) as writer:
+        if workers == 1:
+            for chunk in read_claims(input_path, chunksize):
+                writer.write(validate_chunk(chunk))
+                if progress:
+                    progress(writer.rows)
+            return writer.rows
+
+        # Load the policy index and compile the rule matcher once, here; forked
+        # workers inherit them instead of each reading the policy file again
+        import claim_validation  # noqa: F401
+
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+            for chunk in read_claims(input_path, chunksize):
+                pending.append(pool.submit(validate_chunk, chunk))
+                if len(pending) >= max_in_flight:
+                    writer.write(pending.popleft().result())
+                    if progress:
+                        progress(writer.rows)
+            while pending:
+                writer.write(pending.popleft().result())
+                if progress:
+                    progress(writer.rows)
+        return writer.rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate a file of insurance claims in bulk.")
+    parser.add_argument("input", help="Claims file (.csv or .jsonl) with insurance_type, policy_number and description columns")
+    parser.add_argument("-o", "--output", required=True, help="Results file (.csv or .jsonl)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("-c", "--chunksize", type=int, default=10000, help="Claims per chunk (default: 10000)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Don't print progress")
+    args = parser.parse_args(argv)
+
+    def progress(rows):
+        if not args.quiet:
+            print(f"\rValidated {rows:,} claims", end="", file=sys.stderr, flush=True)
+
+    try:
+        total = run_batch(args.input, args.output, args.workers, args.chunksize, progress)
+    except (OSError, ValueError) as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print(f"\rValidated {total:,} claims -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Deterministic synthetic inputs for the benchmarks (no network, no real data)."""
+import functools
+import io
+import random
+
+import numpy as np
+
+from synth_data import INSURANCE_TYPES, DescriptionVocabulary, PolicyTable, synthetic_image
+
+FILLER = (
+    "the incident happened late in the evening near the main road and was reported "
+    "to the local authorities shortly after with photos taken at the scene"
+).split()
+
+
+def policies(rows, seed=0):
+    """A policy table in the poilicies.csv schema (see synth_data.PolicyTable)"""
+    return PolicyTable(rows, seed).rows_between(0, rows)
+
+
+@functools.lru_cache(maxsize=None)
+def _keywords():
+    # Every rule keyword except maintenance ones, read from the rules file
+    vocabulary = DescriptionVocabulary()
+    return sorted({
+        keyword
+        for keywords in (vocabulary.events, vocabulary.minor_issues, vocabulary.fraud, vocabulary.severity)
+        for by_type in keywords.values()
+        for keyword in by_type
+    })
+
+
+def descriptions(count, words, seed=0):
+    """Claim descriptions of roughly `words` words mixing rule keywords and filler"""
+    rng = random.Random(seed)
+    vocab = _keywords()
+    result = []
+    for _ in range(count):
+        text = [rng.choice(FILLER) for _ in range(words)]
+        for _ in range(max(1, words // 20)):
+            text.insert(rng.randrange(len(text) + 1), rng.choice(vocab))
+        result.append(" ".join(text))
+    return result
+
+
+def claims(policy_table, count, words, seed=0):
+    """(insurance_type, policy_number, description) tuples; most policies exist"""
+    rng = random.Random(seed)
+    rows = policy_table.sample(n=count, replace=True, random_state=seed)
+    texts = descriptions(count, words, seed)
+    return [
+        (insurance_type, str(number if rng.random() < 0.9 else number + 1), text)
+        for (number, insurance_type), text in zip(rows[["policy_number", "insurance_type"]].itertuples(index=False), texts)
+    ]
+
+
+def jpeg_images(count, width, height, seed=0):
+    """In-memory JPEG uploads (BytesIO with a name) of smooth random content"""
+    rng = np.random.default_rng(seed)
+    uploads = []
+    for i in range(count):
+        image = synthetic_image(width, height, rng)
+        data = io.BytesIO()
+        image.save(data, format="JPEG", quality=85)
+        data.seek(0)
+        data.name = f"synthetic_{width}x{height}_{i}.jpg"
+        uploads.append(data)
+    return uploads
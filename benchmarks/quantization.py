@@ -0,0 +1,136 @@
+"""Latency and accuracy of CPU inference backends against the FP32 baseline.
+
+For every configuration, reports per-batch latency (p50/p95), throughput and
+how closely its predictions match FP32 ResNet50: top-1 agreement (same top
+label) and top-5 agreement (average overlap of the top-5 label sets).
+
+    python benchmarks/quantization.py --images path/to/sample/images
+    python benchmarks/quantization.py --configs resnet18:static resnet50:dynamic:cl --json results.json
+
+Without --images, random inputs are used; latency is still meaningful but
+agreement numbers are not.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+
+from vision_backend import BackendConfig, build_model, prepare_batch
+
+DEFAULT_CONFIGS = [
+    "resnet50:dynamic",
+    "resnet50:static",
+    "resnet50:none:cl",
+    "resnet18:none",
+    "resnet18:static",
+    "mobilenet:none",
+    "mobilenet:static",
+]
+BASELINE = "resnet50:none"
+
+
+def parse_config(spec):
+    parts = spec.split(":")
+    return BackendConfig(
+        backbone=parts[0],
+        quantization=parts[1] if len(parts) > 1 else "none",
+        channels_last=len(parts) > 2 and parts[2] == "cl",
+    )
+
+
+def load_inputs(images_dir, count, preprocess):
+    if images_dir:
+        from PIL import Image
+
+        paths = []
+        for pattern in ("*.jpg", "*.jpeg", "*.png"):
+            paths.extend(glob.glob(os.path.join(images_dir, pattern)))
+        paths = sorted(paths)[:count]
+        if paths:
+            return torch.stack([preprocess(Image.open(path).convert("RGB")) for path in paths])
+    torch.manual_seed(0)
+    return torch.randn(count, 3, 224, 224)
+
+
+def run(config, inputs, batch_size, repeats):
+    from vision_module import preprocess
+
+    model = build_model(config, transform=preprocess)
+    batches = [prepare_batch(inputs[i:i + batch_size], config) for i in range(0, len(inputs), batch_size)]
+
+    with torch.no_grad():
+        # Warm-up pass so allocator and kernel selection don't skew the timings
+        model(batches[0])
+
+        latencies = []
+        for _ in range(repeats):
+            for batch in batches:
+                start = time.perf_counter()
+                model(batch)
+                latencies.append(time.perf_counter() - start)
+
+        top5 = torch.cat([torch.topk(model(batch), 5, dim=1).indices for batch in batches])
+
+    latencies.sort()
+    return {
+        "config": config.name,
+        "batch_size": batch_size,
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "images_per_second": batch_size * len(latencies) / sum(latencies),
+    }, top5
+
+
+def agreement(top5, baseline_top5):
+    top1 = (top5[:, 0] == baseline_top5[:, 0]).float().mean().item()
+    overlap = [
+        len(set(row.tolist()) & set(base.tolist())) / 5
+        for row, base in zip(top5, baseline_top5)
+    ]
+    return top1, sum(overlap) / len(overlap)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                        help="backbone[:quantization[:cl]] specs to compare against FP32 resnet50")
+    parser.add_argument("--images", help="Directory of sample images (jpg/png)")
+    parser.add_argument("--count", type=int, default=64, help="Number of inputs (default: 64)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    from vision_module import preprocess
+
+    inputs = load_inputs(args.images, args.count, preprocess)
+    baseline_result, baseline_top5 = run(parse_config(BASELINE), inputs, args.batch_size, args.repeats)
+    baseline_result.update(top1_agreement=1.0, top5_agreement=1.0, speedup=1.0)
+    results = [baseline_result]
+
+    for spec in args.configs:
+        result, top5 = run(parse_config(spec), inputs, args.batch_size, args.repeats)
+        result["top1_agreement"], result["top5_agreement"] = agreement(top5, baseline_top5)
+        result["speedup"] = result["images_per_second"] / baseline_result["images_per_second"]
+        results.append(result)
+
+    print(f"{'config':<28}{'p50 ms':>10}{'p95 ms':>10}{'img/s':>10}{'speedup':>10}{'top1':>8}{'top5':>8}")
+    for r in results:
+        print(f"{r['config']:<28}{r['latency_p50_ms']:>10.1f}{r['latency_p95_ms']:>10.1f}"
+              f"{r['images_per_second']:>10.1f}{r['speedup']:>9.2f}x{r['top1_agreement']:>8.1%}{r['top5_agreement']:>8.1%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""Benchmark suite for the claim pipeline hot paths.
+
+Runs offline against synthetic fixtures and reports, per scenario, throughput,
+p50/p95/p99 latency and peak RSS as JSON. Compare against a stored baseline to
+catch regressions:
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --save-baseline                 # writes benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json --tolerance 0.2
+
+Each scenario runs in its own interpreter, so its peak RSS is its own rather
+than the highest seen by any earlier scenario. Downloads are disabled
+(OFFLINE=1): scenarios that need the vision model are skipped (with the reason
+recorded) when its artifacts are not available locally. Use --only to run a
+subset and --quick for smaller sizes.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Claims submitted by the benchmarks (and their image hashes) go to a throwaway
+# database, never the real claims.db; set before claim_store is imported
+_db_dir = tempfile.TemporaryDirectory(prefix="claim-bench-")
+os.environ["CLAIM_DB_PATH"] = os.path.join(_db_dir.name, "claims.db")
+# Never fetch model artifacts; scenarios without them are skipped
+os.environ["OFFLINE"] = "1"
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import fixtures
+
+# claim_validation loads POLICIES_CSV when imported; give it a small synthetic
+# table (scenarios swap in their own sizes with _use_policies)
+os.environ["POLICIES_CSV"] = os.path.join(_db_dir.name, "policies.csv")
+fixtures.policies(1_000).to_csv(os.environ["POLICIES_CSV"], index=False)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+
+class Skip(Exception):
+    pass
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def measure(name, func, iterations, items_per_call=1, warmup=1, params=None):
+    """Time func() iterations times; returns a result dict"""
+    for _ in range(warmup):
+        func()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "name": name,
+        "params": params or {},
+        "iterations": iterations,
+        "throughput_per_s": items_per_call * len(latencies) / sum(latencies),
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p95_ms": percentile(latencies, 0.95) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _use_policies(rows):
+    """Point claim_validation at a synthetic policy table of the given size"""
+    import claim_validation
+    from policy_index import PolicyIndex
+
+    table = fixtures.policies(rows)
+    claim_validation.POLICY_INDEX = PolicyIndex(table)
+    return table
+
+
+def bench_validate_claim(quick):
+    from claim_validation import validate_claim
+
+    sizes = [1_000, 100_000] if quick else [1_000, 100_000, 1_000_000]
+    for rows in sizes:
+        table = _use_policies(rows)
+        for words in (20, 200, 2000):
+            claims = fixtures.claims(table, 200, words)
+            yield measure(
+                "validate_claim",
+                lambda: [validate_claim(*claim) for claim in claims],
+                iterations=5 if quick else 20,
+                items_per_call=len(claims),
+                params={"policies": rows, "description_words": words},
+            )
+
+
+def bench_get_policy_holder(quick):
+    from claim_validation import get_policy_holder
+
+    sizes = [1_000, 100_000] if quick else [1_000, 100_000, 1_000_000]
+    for rows in sizes:
+        table = _use_policies(rows)
+        numbers = [str(n) for n in table["policy_number"].sample(n=1000, replace=True, random_state=1)]
+        yield measure(
+            "get_policy_holder",
+            lambda: [get_policy_holder(number) for number in numbers],
+            iterations=10 if quick else 50,
+            items_per_call=len(numbers),
+            params={"policies": rows},
+        )
+
+
+def _vision_module():
+    import artifacts
+
+    try:
+        import vision_module
+        vision_module.get_model()
+    except (artifacts.ArtifactError, ImportError, OSError) as e:
+        raise Skip(f"vision model unavailable: {e}")
+    return vision_module
+
+
+def bench_analyze_image(quick):
+    vision_module = _vision_module()
+    batch_sizes = [1, 8, 32] if quick else [1, 2, 4, 8, 16, 32]
+    resolutions = [(640, 480), (4000, 3000)] if quick else [(640, 480), (1920, 1080), (4000, 3000)]
+
+    for width, height in resolutions:
+        uploads = fixtures.jpeg_images(max(batch_sizes), width, height)
+        for batch_size in batch_sizes:
+            batch = uploads[:batch_size]
+
+            def run():
+                # Measure the uncached path
+                vision_module.prediction_cache.clear()
+                vision_module.analyze_images(batch, "Auto")
+
+            yield measure(
+                "analyze_image",
+                run,
+                iterations=3 if quick else 10,
+                items_per_call=batch_size,
+                params={"batch_size": batch_size, "resolution": f"{width}x{height}"},
+            )
+
+
+def bench_genai(quick):
+    from genai_module import get_genai_response, get_claim_guidance
+
+    texts = fixtures.descriptions(100, 50)
+    for insurance_type in fixtures.INSURANCE_TYPES:
+        yield measure(
+            "get_genai_response",
+            lambda: [get_genai_response(insurance_type, text) for text in texts],
+            iterations=10 if quick else 50,
+            items_per_call=len(texts),
+            params={"insurance_type": insurance_type},
+        )
+        yield measure(
+            "get_claim_guidance",
+            lambda: get_claim_guidance(insurance_type),
+            iterations=100 if quick else 1000,
+            params={"insurance_type": insurance_type},
+        )
+
+
+def bench_submission(quick):
+    """End-to-end Step 4: queue a claim with photos and wait for every result"""
+    _vision_module()
+    from claim_queue import ClaimProcessor
+
+    from image_hash_index import get_image_index
+
+    table = _use_policies(1_000)
+    claim = fixtures.claims(table, 1, 100)[0]
+    # Created (and its history load started) before anything is measured
+    get_image_index()
+    processor = ClaimProcessor()
+    for photos in ([0, 4] if quick else [0, 4, 16]):
+        uploads = fixtures.jpeg_images(photos, 1920, 1080)
+
+        def run():
+            import vision_module
+            vision_module.prediction_cache.clear()
+            claim_id = processor.submit(*claim, image_files=uploads)
+            while processor.get_job(claim_id)["status"] not in ("done", "failed"):
+                time.sleep(0.001)
+
+        yield measure(
+            "submission",
+            run,
+            iterations=3 if quick else 10,
+            params={"photos": photos},
+        )
+    processor.shutdown()
+
+
+SCENARIOS = {
+    "validate_claim": bench_validate_claim,
+    "get_policy_holder": bench_get_policy_holder,
+    "analyze_image": bench_analyze_image,
+    "genai": bench_genai,
+    "submission": bench_submission,
+}
+
+
+def result_key(result):
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions: p95 latency up or throughput down by more than tolerance"""
+    previous = {result_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if not before:
+            continue
+        if result["latency_p95_ms"] > before["latency_p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result_key(result)}: p95 {before['latency_p95_ms']:.2f}ms -> {result['latency_p95_ms']:.2f}ms")
+        if result["throughput_per_s"] < before["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{result_key(result)}: throughput {before['throughput_per_s']:.1f}/s -> {result['throughput_per_s']:.1f}/s")
+    return regressions
+
+
+def run_scenario(name, quick):
+    """Run one scenario in a fresh interpreter; returns (results, skip reason or None)"""
+    with tempfile.TemporaryDirectory(prefix="claim-bench-") as directory:
+        output = os.path.join(directory, "results.json")
+        command = [sys.executable, os.path.abspath(__file__), "--scenario", name, "--output", output]
+        if quick:
+            command.append("--quick")
+        completed = subprocess.run(command)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Scenario {name} failed (exit code {completed.returncode})")
+        with open(output, encoding="utf-8") as f:
+            report = json.load(f)
+    return report["results"], report["skipped"]
+
+
+def run_scenario_here(name, quick, output):
+    """Worker side of run_scenario()"""
+    results, skipped = [], None
+    try:
+        for result in SCENARIOS[name](quick):
+            print(f"  {result_key(result)}: p50 {result['latency_p50_ms']:.2f}ms, "
+                  f"{result['throughput_per_s']:.1f}/s", file=sys.stderr)
+            results.append(result)
+    except Skip as e:
+        skipped = str(e)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"results": results, "skipped": skipped}, f)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS), help="Scenarios to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and fewer iterations")
+    parser.add_argument("--output", help="Write results JSON to this file (default: stdout)")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Also write results to {DEFAULT_BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression fraction (default: 0.2)")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.scenario:
+        return run_scenario_here(args.scenario, args.quick, args.output)
+
+    results, skipped = [], {}
+    for name in args.only or SCENARIOS:
+        print(f"Running {name}...", file=sys.stderr)
+        scenario_results, reason = run_scenario(name, args.quick)
+        results += scenario_results
+        if reason:
+            print(f"  skipped: {reason}", file=sys.stderr)
+            skipped[name] = reason
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "results": results,
+        "skipped": skipped,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+        print("✅ No regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
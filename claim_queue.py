@@ -0,0 +1,284 @@
+"""Background processing of submitted claims.
+
+Submitting a claim returns a claim ID straight away; validation, AI guidance
+and image analysis run on a shared worker pool. Text validation and document
+analysis are separate tasks so they overlap, and images are analyzed in small
+batches (PDFs one at a time) so results appear as each batch finishes. The UI polls get_job() for
+a snapshot of the job's progress. AI guidance is streamed into the job as it is
+generated (see stream_guidance()); its templated next steps are there from submit.
+
+The processor returned by get_processor() also writes each claim to the claim
+history (store, statistics, duplicate index) as soon as its validation and
+guidance are done, whether or not the submitting session is still open.
+"""
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from claim_validation import validate_claim_status
+from genai_module import stream_genai_response, final_guidance_summary, get_next_steps_text
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CLAIM_WORKERS = int(os.environ.get("CLAIM_WORKERS", "4"))
+IMAGE_BATCH_SIZE = int(os.environ.get("IMAGE_BATCH_SIZE", "4"))
+MAX_TRACKED_JOBS = int(os.environ.get("MAX_TRACKED_JOBS", "1000"))
+
+
+class ClaimJob:
+    """Progress and partial results of one submitted claim"""
+
+    def __init__(self, claim_id, image_names, guidance_next_steps="", details=None):
+        self.claim_id = claim_id
+        # What was submitted (name, policy_number, insurance_type, description, documents, timestamp)
+        self.details = dict(details or {})
+        self.status = "queued"
+        self.validation = None
+        self.validation_status = None
+        self.ai_guidance = None
+        self.ai_guidance_partial = ""
+        self.guidance_next_steps = guidance_next_steps
+        self.image_names = list(image_names)
+        self.image_results = [None] * len(self.image_names)
+        self.errors = []
+        self.duplicates = []
+        self.recorded = False
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._pending_tasks = 0
+        self._lock = threading.Lock()
+
+    def _finish_task(self):
+        with self._lock:
+            self._pending_tasks -= 1
+            if self._pending_tasks == 0:
+                self.status = "failed" if self.errors else "done"
+                self.finished_at = time.time()
+                metrics.observe("claim.total", self.finished_at - self.submitted_at)
+
+    def _update(self, **fields):
+        with self._lock:
+            if self.status == "queued":
+                self.status = "running"
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def _set_images(self, start, results):
+        with self._lock:
+            self.image_results[start:start + len(results)] = results
+
+    def _add_error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "claim_id": self.claim_id,
+                "status": self.status,
+                "validation": self.validation,
+                "validation_status": self.validation_status,
+                "ai_guidance": self.ai_guidance,
+                "ai_guidance_partial": self.ai_guidance_partial,
+                "guidance_next_steps": self.guidance_next_steps,
+                "images": list(zip(self.image_names, self.image_results)),
+                "errors": list(self.errors),
+                "duplicates": list(self.duplicates),
+                "recorded": self.recorded,
+                "submitted_at": self.submitted_at,
+                "finished_at": self.finished_at,
+            }
+
+
+def _copy_upload(uploaded_file):
+    # Uploads belong to the Streamlit session, which is reset after submit
+    data = io.BytesIO(uploaded_file.getvalue())
+    data.name = getattr(uploaded_file, "name", "")
+    return data
+
+
+class ClaimProcessor:
+    def __init__(self, workers=CLAIM_WORKERS, image_batch_size=IMAGE_BATCH_SIZE, on_text_done=None):
+        """on_text_done(job), if given, runs on the worker once a claim's validation and
+        guidance are finished (or have failed), e.g. to record the claim"""
+        self.image_batch_size = image_batch_size
+        self.on_text_done = on_text_done
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="claim-worker")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._queued_tasks = 0
+
+    def submit(self, insurance_type, policy_number, description, image_files=(), pdf_files=(), name=None):
+        """Queue a claim for processing and return its claim ID immediately"""
+        claim_id = uuid.uuid4().hex[:12].upper()
+        images = [_copy_upload(f) for f in image_files]
+        pdfs = [_copy_upload(f) for f in pdf_files]
+        details = {
+            "timestamp": datetime.now().isoformat(),
+            "name": name,
+            "policy_number": policy_number,
+            "insurance_type": insurance_type,
+            "description": description,
+            "documents": len(images) + len(pdfs),
+        }
+        job = ClaimJob(claim_id, [f.name for f in images + pdfs], get_next_steps_text(insurance_type), details)
+
+        with self._lock:
+            self._jobs[claim_id] = job
+            self._forget_old_jobs()
+        metrics.increment("claims_submitted")
+
+        tasks = [(self._run_text, (job, insurance_type, policy_number, description), self.on_text_done)]
+        if images or pdfs:
+            tasks.append((self._run_documents, (job, images, pdfs, insurance_type, policy_number), None))
+        # Counted before any task runs, so a fast text task can't finish the job early
+        job._pending_tasks = len(tasks)
+        for task, args, then in tasks:
+            self._enqueue(job, task, args, then)
+        return claim_id
+
+    def get_job(self, claim_id):
+        """Snapshot of a job's progress, or None if the claim ID is unknown"""
+        with self._lock:
+            job = self._jobs.get(claim_id)
+        return job.snapshot() if job else None
+
+    def stream_guidance(self, claim_id, poll_interval=0.05):
+        """Yield a job's AI guidance summary as it is generated, until it is complete"""
+        sent = 0
+        while True:
+            job = self.get_job(claim_id)
+            if job is None:
+                return
+            text = job["ai_guidance_partial"]
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+            if job["ai_guidance"] is not None or job["status"] in ("done", "failed"):
+                return
+            time.sleep(poll_interval)
+
+    def queue_depth(self):
+        with self._lock:
+            return self._queued_tasks
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _forget_old_jobs(self):
+        # Keep memory bounded: drop the oldest finished jobs beyond the limit
+        if len(self._jobs) <= MAX_TRACKED_JOBS:
+            return
+        for claim_id in [cid for cid, job in self._jobs.items() if job.finished]:
+            if len(self._jobs) <= MAX_TRACKED_JOBS:
+                break
+            del self._jobs[claim_id]
+
+    def _enqueue(self, job, task, args, then=None):
+        """Run task(*args) on the pool, then then(job) (also when the task failed)"""
+        with self._lock:
+            self._queued_tasks += 1
+        enqueued_at = time.perf_counter()
+
+        def run():
+            with self._lock:
+                self._queued_tasks -= 1
+            metrics.observe("queue.wait", time.perf_counter() - enqueued_at)
+            try:
+                with metrics.span(f"claim.{task.__name__.lstrip('_')}"):
+                    task(*args)
+            except Exception as e:
+                job._add_error(f"⚠️ Error processing claim: {str(e)}")
+            try:
+                if then is not None:
+                    then(job)
+            except Exception:
+                logger.exception("Claim %s: completion hook failed", job.claim_id)
+            finally:
+                job._finish_task()
+
+        self._pool.submit(run)
+
+    def _run_text(self, job, insurance_type, policy_number, description):
+        status, message = validate_claim_status(insurance_type, policy_number, description)
+        metrics.increment("claims_validated", status=status.value)
+        job._update(validation=message, validation_status=status)
+        with metrics.span("genai.response"):
+            summary = ""
+            for chunk in stream_genai_response(insurance_type, description):
+                summary += chunk
+                job._update(ai_guidance_partial=summary)
+        summary = final_guidance_summary(insurance_type, description, summary)
+        job._update(ai_guidance=summary + job.guidance_next_steps)
+
+    def _run_documents(self, job, images, pdfs, insurance_type, policy_number):
+        # Imported here so torch only loads once a claim has documents
+        from vision_module import analyze_images
+        from pdf_module import analyze_pdf
+
+        job._update()
+        for start in range(0, len(images), self.image_batch_size):
+            batch = images[start:start + self.image_batch_size]
+            job._set_images(start, analyze_images(batch, insurance_type, job.claim_id, policy_number))
+        for offset, pdf in enumerate(pdfs):
+            job._set_images(len(images) + offset, [analyze_pdf(pdf, insurance_type)])
+
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def record_claim(job, store, stats, duplicate_index):
+    """Write a claim whose validation and guidance are done to the claim history"""
+    from claim_validation import ClaimStatus
+
+    snapshot = job.snapshot()
+    details = job.details
+    # Checked against earlier claims before this one joins the index
+    duplicates = duplicate_index.add(job.claim_id, details["description"])
+    record = {
+        "claim_id": job.claim_id,
+        "timestamp": details["timestamp"],
+        "name": details["name"],
+        "policy_number": details["policy_number"],
+        "insurance_type": details["insurance_type"],
+        "description": details["description"],
+        "status": snapshot["validation"] or (snapshot["errors"] or ["❌ Claim could not be processed."])[0],
+        "status_code": (snapshot["validation_status"] or ClaimStatus.REJECTED).value,
+        "ai_guidance": snapshot["ai_guidance"] or "",
+        "documents": details["documents"],
+        "duplicate_of": ", ".join(claim_id for claim_id, _ in duplicates) or None,
+    }
+    store.add(record)
+    stats.record(record["insurance_type"], record["status_code"])
+    job._update(duplicates=duplicates, recorded=True)
+
+
+def get_processor():
+    """The process-wide claim processor, shared by all sessions; it records every
+    claim in the shared claim history"""
+    global _processor
+    with _processor_lock:
+        if _processor is None:
+            from claim_store import get_store
+            from claim_stats import get_stats
+            from duplicate_index import get_duplicate_index
+
+            store = get_store()
+            stats, duplicate_index = get_stats(store), get_duplicate_index(store)
+            _processor = ClaimProcessor(
+                on_text_done=lambda job: record_claim(job, store, stats, duplicate_index)
+            )
+            metrics.register_gauge("queue_depth", _processor.queue_depth)
+        return _processor
@@ -0,0 +1,115 @@
+"""Running claim statistics for the sidebar and history page.
+
+Counters are updated once per submitted claim (record()) instead of being
+recomputed from the full history on every rerun. They are seeded from the
+claim store's indexed GROUP BY queries when the process starts.
+
+Recent claims are counted in per-minute buckets (a ring covering the largest
+window), so a window's rate is a sum over at most a day's worth of minute
+counters rather than a scan of every recent claim.
+"""
+import threading
+import time
+from collections import Counter
+
+# Rolling windows (seconds) for recent-claim rates
+WINDOWS = {"1h": 3600, "24h": 86400}
+BUCKET_SECONDS = 60
+
+
+class ClaimStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.total = 0
+            self.by_status = Counter()
+            self.by_type = Counter()
+            self._reset_buckets()
+
+    def _reset_buckets(self):
+        # Ring of per-minute status counters; slot i holds minute _minutes[i]
+        size = max(WINDOWS.values()) // BUCKET_SECONDS
+        self._buckets = [Counter() for _ in range(size)]
+        self._minutes = [None] * size
+
+    def _count_recent(self, timestamp, status, now):
+        minute = int(timestamp // BUCKET_SECONDS)
+        if minute <= int(now // BUCKET_SECONDS) - len(self._buckets):
+            return
+        slot = minute % len(self._buckets)
+        if self._minutes[slot] != minute:
+            if self._minutes[slot] is not None and self._minutes[slot] > minute:
+                return
+            self._buckets[slot].clear()
+            self._minutes[slot] = minute
+        self._buckets[slot][status] += 1
+
+    def record(self, insurance_type, status, timestamp=None):
+        """Count one submitted claim; status is a ClaimStatus value string"""
+        now = time.time()
+        timestamp = now if timestamp is None else timestamp
+        with self._lock:
+            self.total += 1
+            self.by_status[status] += 1
+            self.by_type[insurance_type] += 1
+            self._count_recent(timestamp, status, now)
+
+    def seed(self, status_counts, type_counts, recent=()):
+        """Initialise counters from stored totals and recent (timestamp, status) pairs"""
+        with self._lock:
+            self.by_status = Counter(status_counts)
+            self.by_type = Counter(type_counts)
+            self.total = sum(self.by_type.values())
+            self._reset_buckets()
+            now = time.time()
+            for timestamp, status in recent:
+                self._count_recent(timestamp, status, now)
+
+    def count(self, status):
+        with self._lock:
+            return self.by_status[status]
+
+    def window_rates(self, status):
+        """Share of claims with the given status in each rolling window (to the minute)"""
+        current = int(time.time() // BUCKET_SECONDS)
+        rates = {}
+        with self._lock:
+            for name, seconds in WINDOWS.items():
+                oldest = current - seconds // BUCKET_SECONDS
+                claims = matching = 0
+                for minute, bucket in zip(self._minutes, self._buckets):
+                    if minute is not None and oldest < minute <= current:
+                        claims += sum(bucket.values())
+                        matching += bucket[status]
+                rates[name] = {
+                    "claims": claims,
+                    "rate": matching / claims if claims else 0.0,
+                }
+        return rates
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "total": self.total,
+                "by_status": dict(self.by_status),
+                "by_type": dict(self.by_type),
+            }
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats(store=None):
+    """The process-wide statistics, seeded from store on first use"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = ClaimStats()
+            if store is not None:
+                since = time.time() - max(WINDOWS.values())
+                _stats.seed(store.status_counts(), store.type_counts(), store.recent_statuses(since))
+        return _stats
@@ -0,0 +1,250 @@
+"""Durable claim history backed by SQLite.
+
+Replaces the per-session claim_history list. The database runs in WAL mode so
+readers (history page, sidebar stats) never block the writer, and the columns
+the UI filters and sorts on are indexed so counts and pages are served by
+index lookups instead of scanning every claim in Python.
+
+Each process uses a single connection shared by all threads (Streamlit runs
+every rerun on a new thread, so per-thread connections would pile up). Access
+is serialized by a lock, and bulk reads fetch one keyed batch at a time so the
+lock is never held between batches.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.environ.get("CLAIM_DB_PATH", os.path.join(current_dir, "claims.db"))
+
+COLUMNS = [
+    "claim_id", "timestamp", "name", "policy_number", "insurance_type",
+    "description", "status", "status_code", "ai_guidance", "documents", "duplicate_of",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    claim_id TEXT UNIQUE,
+    timestamp TEXT NOT NULL,
+    name TEXT,
+    policy_number TEXT,
+    insurance_type TEXT,
+    description TEXT,
+    status TEXT,
+    status_code TEXT,
+    ai_guidance TEXT,
+    documents INTEGER DEFAULT 0,
+    duplicate_of TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_claims_timestamp ON claims (timestamp);
+CREATE INDEX IF NOT EXISTS idx_claims_policy_number ON claims (policy_number);
+CREATE INDEX IF NOT EXISTS idx_claims_insurance_type ON claims (insurance_type, timestamp);
+CREATE TABLE IF NOT EXISTS image_hashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    claim_id TEXT NOT NULL,
+    policy_number TEXT,
+    file_name TEXT,
+    dhash INTEGER NOT NULL
+);
+"""
+
+# Created after the status_code migration so older databases get the column first
+STATUS_INDEX = "CREATE INDEX IF NOT EXISTS idx_claims_status ON claims (status_code, timestamp);"
+
+# Status codes for rows written before status_code existed, from their message's emoji
+LEGACY_STATUS_PREFIXES = {
+    "✅": "approved",
+    "⚠️": "pending_review",
+    "❌": "rejected",
+    "🚨": "fraud",
+}
+
+# Columns shown in the history list; the full description and AI guidance are fetched on demand
+SUMMARY_COLUMNS = (
+    "claim_id, name, policy_number, insurance_type, status, status_code, documents, duplicate_of, "
+    "substr(replace(timestamp, 'T', ' '), 1, 16) AS date, "
+    "substr(description, 1, 100) AS description_preview"
+)
+
+
+class ClaimStore:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._lock:
+            connection = self._connection = self._connect()
+            connection.executescript(SCHEMA)
+            self._migrate(connection)
+            connection.execute(STATUS_INDEX)
+
+    def _migrate(self, connection):
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(claims)")}
+        if "duplicate_of" not in columns:
+            with connection:
+                connection.execute("ALTER TABLE claims ADD COLUMN duplicate_of TEXT")
+        if "status_code" in columns:
+            return
+        with connection:
+            connection.execute("DROP INDEX IF EXISTS idx_claims_status")
+            connection.execute("ALTER TABLE claims ADD COLUMN status_code TEXT")
+            for prefix, status_code in LEGACY_STATUS_PREFIXES.items():
+                connection.execute(
+                    "UPDATE claims SET status_code = ? WHERE substr(status, 1, ?) = ?",
+                    (status_code, len(prefix), prefix),
+                )
+
+    def _connect(self):
+        # Shared by every thread of the process; all use goes through self._lock
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def _batches(self, columns, table, batch_size):
+        # Keyed on id, one short query per batch, so writers can run in between
+        last_id = 0
+        while True:
+            rows = self._fetchall(
+                f"SELECT id, {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            )
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield rows
+
+    def add(self, record):
+        self.add_many([record])
+
+    def add_many(self, records):
+        """Insert claim records (dicts with COLUMNS keys) in a single transaction"""
+        rows = [tuple(record.get(column) for column in COLUMNS) for record in records]
+        if not rows:
+            return
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._lock:
+            connection = self._connection
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO claims ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                    rows,
+                )
+
+    def _where(self, insurance_type=None, status=None, policy_number=None, since=None, until=None):
+        clauses, params = [], []
+        if insurance_type:
+            clauses.append("insurance_type = ?")
+            params.append(insurance_type)
+        if status:
+            clauses.append("status_code = ?")
+            params.append(status)
+        if policy_number:
+            clauses.append("policy_number = ?")
+            params.append(str(policy_number))
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._fetchall(f"SELECT COUNT(*) FROM claims {where}", params)[0][0]
+
+    def status_counts(self):
+        rows = self._fetchall("SELECT status_code, COUNT(*) FROM claims GROUP BY status_code")
+        return {row[0]: row[1] for row in rows}
+
+    def type_counts(self):
+        rows = self._fetchall("SELECT insurance_type, COUNT(*) FROM claims GROUP BY insurance_type")
+        return {row[0]: row[1] for row in rows}
+
+    def recent_statuses(self, since):
+        """(epoch seconds, status_code) for claims submitted after the given epoch time"""
+        rows = self._fetchall(
+            "SELECT timestamp, status_code FROM claims WHERE timestamp >= ?",
+            (datetime.fromtimestamp(since).isoformat(),),
+        )
+        return [(datetime.fromisoformat(row[0]).timestamp(), row[1]) for row in rows]
+
+    def query(self, page=1, page_size=20, summary=False, **filters):
+        """One page of claims, newest first, as a list of dicts.
+
+        With summary=True only the list columns (SUMMARY_COLUMNS) are read.
+        """
+        where, params = self._where(**filters)
+        offset = max(page - 1, 0) * page_size
+        columns = SUMMARY_COLUMNS if summary else ", ".join(COLUMNS)
+        rows = self._fetchall(
+            f"SELECT {columns} FROM claims {where} "
+            "ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+            params + [page_size, offset],
+        )
+        return [dict(row) for row in rows]
+
+    def get_guidance(self, claim_id):
+        rows = self._fetchall("SELECT ai_guidance FROM claims WHERE claim_id = ?", (claim_id,))
+        return rows[0][0] if rows else None
+
+    def iter_descriptions(self, batch_size=10000):
+        """(claim_id, description) for every claim, oldest first, in lists of up to batch_size"""
+        for rows in self._batches("claim_id, description", "claims", batch_size):
+            yield [(row["claim_id"], row["description"] or "") for row in rows]
+
+    def add_image_hashes(self, rows):
+        """Store (claim_id, policy_number, file_name, 64-bit perceptual hash) rows"""
+        # SQLite integers are signed 64-bit
+        rows = [(claim_id, str(policy_number), file_name, value - (1 << 64) if value >= 1 << 63 else value)
+                for claim_id, policy_number, file_name, value in rows]
+        with self._lock:
+            connection = self._connection
+            with connection:
+                connection.executemany(
+                    "INSERT INTO image_hashes (claim_id, policy_number, file_name, dhash) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+
+    def iter_image_hashes(self, batch_size=50000):
+        """(claim_id, policy_number, hash) for every stored image hash, in lists of up to batch_size"""
+        for rows in self._batches("claim_id, policy_number, dhash", "image_hashes", batch_size):
+            yield [(row["claim_id"], row["policy_number"], row["dhash"] & ((1 << 64) - 1)) for row in rows]
+
+    def to_dataframe(self):
+        """All claims, newest first (for export)"""
+        with self._lock:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(COLUMNS)} FROM claims ORDER BY timestamp DESC",
+                self._connection,
+            )
+
+    def clear(self):
+        with self._lock:
+            connection = self._connection
+            with connection:
+                connection.execute("DELETE FROM claims")
+                connection.execute("DELETE FROM image_hashes")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The process-wide claim store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ClaimStore()
+        return _store
@@ -1,109 +1,149 @@
 import pandas as pd
 import os
+from enum import Enum
+from policy_index import PolicyIndex
+from rule_engine import RuleEngine
+import metrics
 
 # Load your policy dataset once with proper path handling
 current_dir = os.path.dirname(os.path.abspath(__file__))
-csv_path = os.path.join(os.path.dirname(current_dir), "poilicies.csv")
+csv_path = os.environ.get("POLICIES_CSV") or os.path.join(os.path.dirname(current_dir), "poilicies.csv")
 POLICIES = pd.read_csv(csv_path)
 
+# Hash index over POLICIES so lookups don't scan the table
+POLICY_INDEX = PolicyIndex(POLICIES)
+
+class ClaimStatus(Enum):
+    """Structured outcome of claim validation, stored alongside the result message"""
+    APPROVED = "approved"
+    PENDING_REVIEW = "pending_review"
+    REJECTED = "rejected"
+    FRAUD = "fraud"
+
+    @property
+    def label(self):
+        return STATUS_LABELS[self]
+
+STATUS_LABELS = {
+    ClaimStatus.APPROVED: "Approved",
+    ClaimStatus.PENDING_REVIEW: "Pending Review",
+    ClaimStatus.REJECTED: "Rejected",
+    ClaimStatus.FRAUD: "Fraud Flagged",
+}
+
+# Description rules (valid events, minor issues, maintenance, fraud, severity) live in
+# claim_rules.json and are reloaded when the file changes (see rule_engine.py)
+RULES_PATH = os.environ.get("CLAIM_RULES_PATH") or os.path.join(current_dir, "claim_rules.json")
+RULE_ENGINE = RuleEngine(
+    RULES_PATH,
+    statuses=[status.value for status in ClaimStatus],
+    reload_interval=float(os.environ.get("CLAIM_RULES_RELOAD_INTERVAL", "2")),
+)
+
+def parse_policy_number(policy_number):
+    """Policy number as an int; raises ValueError for anything that isn't a whole number.
+
+    Values from JSONL or CSV input may be None, lists or floats; 1001.9 must not
+    silently become policy 1001.
+    """
+    if isinstance(policy_number, (str, bytes)):
+        return int(policy_number)
+    if isinstance(policy_number, bool):
+        raise ValueError(f"Invalid policy number: {policy_number!r}")
+    try:
+        number = int(policy_number)
+    except (TypeError, OverflowError) as e:
+        raise ValueError(f"Invalid policy number: {policy_number!r}") from e
+    if number != policy_number:
+        raise ValueError(f"Policy number is not a whole number: {policy_number!r}")
+    return number
+
 def validate_claim(insurance_type, policy_number, description):
+    return validate_claim_status(insurance_type, policy_number, description)[1]
+
+def validate_claim_status(insurance_type, policy_number, description):
+    """Validate a claim; returns (ClaimStatus, result message)"""
     if not policy_number or not description:
-        return "❌ Please provide all required claim details."
+        return ClaimStatus.REJECTED, "❌ Please provide all required claim details."
 
     try:
-        policy_number = int(policy_number)
+        policy_number = parse_policy_number(policy_number)
     except ValueError:
-        return "❌ Invalid policy number format. Please enter digits only."
+        return ClaimStatus.REJECTED, "❌ Invalid policy number format. Please enter digits only."
 
     # Check if policy number exists and matches insurance type
-    matching_policy = POLICIES[
-        (POLICIES['policy_number'] == policy_number) &
-        (POLICIES['insurance_type'].str.lower() == insurance_type.lower())
-    ]
+    with metrics.span("validation.policy_lookup"):
+        matched = POLICY_INDEX.matches(policy_number, insurance_type)
+    if not matched:
+        return ClaimStatus.REJECTED, "❌ Invalid policy number or mismatched insurance type."
 
-    if matching_policy.empty:
-        return "❌ Invalid policy number or mismatched insurance type."
+    return check_description(insurance_type, description)
 
-    desc = description.lower()
-    
-    # STRICT VALIDATION: Only allow legitimate insurance claims
-    VALID_CLAIM_EVENTS = {
-        "Auto": [
-            "accident", "collision", "crash", "total loss", "stolen", "theft", 
-            "hit and run", "severe damage", "major damage", "write-off",
-            "rear-ended", "side-swiped", "rollover", "flood damage", "fire damage"
-        ],
-        "Home": [
-            "fire", "flood", "earthquake", "storm", "hurricane", "tornado", 
-            "theft", "burglary", "vandalism", "structural damage", "roof damage",
-            "water damage", "mold", "electrical fire", "gas leak", "explosion",
-            "natural disaster", "severe weather", "lightning strike"
-        ],
-        "Health": [
-            "emergency", "hospitalization", "surgery", "critical illness", 
-            "serious injury", "accident", "heart attack", "stroke", "cancer",
-            "broken bone", "fracture", "severe pain", "life-threatening",
-            "medical emergency", "ambulance", "intensive care", "icu"
-        ]
-    }
+def check_description(insurance_type, description):
+    """Apply the claim rules to a description whose policy has already been matched.
 
-    # Check if description contains a valid claim event
-    valid_events = VALID_CLAIM_EVENTS.get(insurance_type, [])
-    has_valid_event = any(event in desc for event in valid_events)
-    
-    if not has_valid_event:
-        return f"❌ Invalid {insurance_type} claim. Must specify a legitimate insurance event like accident, fire, theft, or medical emergency."
-    
-    # Check for minor issues that shouldn't be claimed
-    minor_issues = {
-        "Auto": ["small scratch", "minor dent", "cosmetic damage", "paint chip", "small ding", "light scratch"],
-        "Home": ["small leak", "minor stain", "cosmetic damage", "small crack", "minor wear", "light damage"],
-        "Health": ["minor cold", "small cut", "minor bruise", "headache", "minor pain", "small injury"]
-    }
-    
-    minor_keywords = minor_issues.get(insurance_type, [])
-    if any(issue in desc for issue in minor_keywords):
-        return f"❌ Minor {insurance_type} issue detected. This doesn't qualify for insurance claim."
-    
-    # Check for maintenance/regular issues
-    maintenance_issues = [
-        "regular maintenance", "routine check", "preventive care", "annual checkup",
-        "wear and tear", "normal wear", "aging", "old", "worn out", "maintenance",
-        "service", "oil change", "tune up", "cleaning", "minor repair"
-    ]
-    
-    if any(issue in desc for issue in maintenance_issues):
-        return "❌ Maintenance/regular issues are not covered by insurance."
-    
-    # Enhanced fraud detection
-    fraud_patterns = [
-        "repeat claim", "exaggerated", "suspicious", "fake", "scam", "false report",
-        "fraudulent", "duplicate", "multiple claims", "suspicious activity", 
-        "unusual pattern", "made up", "fake damage", "pretend", "simulate"
-    ]
-    
-    if any(pat in desc for pat in fraud_patterns):
-        return "🚨 Fraud detected! Claim flagged for investigation."
-    
-    # Check for severity indicators
-    severity_indicators = ["severe", "major", "extensive", "significant", "substantial", "serious", "critical"]
-    has_severity = any(severity in desc for severity in severity_indicators)
-    
-    if has_severity:
-        return f"✅ {insurance_type} claim APPROVED. High severity incident confirmed."
-    else:
-        return f"⚠️ {insurance_type} claim PENDING REVIEW. Please provide more details about damage severity."
+    Returns (ClaimStatus, result message).
+    """
+    # The insurance type's rule set is scanned once and its rules applied in order
+    with metrics.span("validation.rules"):
+        status, message = RULE_ENGINE.evaluate(insurance_type, description)
+    return ClaimStatus(status), message
+
+def validate_claims(insurance_types, policy_numbers, descriptions):
+    """Validate many claims at once; returns one result message per claim, in order."""
+    return [message for _, message in validate_claims_status(insurance_types, policy_numbers, descriptions)]
+
+def validate_claims_status(insurance_types, policy_numbers, descriptions):
+    """Validate many claims at once; returns one (ClaimStatus, message) per claim, in order.
+
+    Same rules and messages as validate_claim, but policy matching is done as one
+    bulk index lookup for the whole batch.
+    """
+    insurance_types = list(insurance_types)
+    descriptions = list(descriptions)
+    results = [None] * len(insurance_types)
+    parsed_numbers = [None] * len(insurance_types)
+
+    for i, (policy_number, description) in enumerate(zip(policy_numbers, descriptions)):
+        if not policy_number or not description:
+            results[i] = ClaimStatus.REJECTED, "❌ Please provide all required claim details."
+            continue
+        try:
+            parsed_numbers[i] = parse_policy_number(policy_number)
+        except ValueError:
+            results[i] = ClaimStatus.REJECTED, "❌ Invalid policy number format. Please enter digits only."
+
+    with metrics.span("validation.policy_lookup_bulk"):
+        matches = POLICY_INDEX.matches_many(parsed_numbers, insurance_types)
+
+    for i, matched in enumerate(matches):
+        if results[i] is not None:
+            continue
+        if not matched:
+            results[i] = ClaimStatus.REJECTED, "❌ Invalid policy number or mismatched insurance type."
+        else:
+            results[i] = check_description(insurance_types[i], descriptions[i])
+
+    return results
 
 def get_policy_holder(policy_number):
     """Get policy holder name for a given policy number"""
     try:
-        policy_number = int(policy_number)
-        matching_policy = POLICIES[POLICIES['policy_number'] == policy_number]
-        if not matching_policy.empty:
-            return matching_policy.iloc[0]['policy_holder']
-        return None
-    except:
+        policy_number = parse_policy_number(policy_number)
+    except ValueError:
         return None
+    with metrics.span("validation.policy_holder"):
+        return POLICY_INDEX.get_holder(policy_number)
+
+def get_policy_holders(policy_numbers):
+    """Get policy holder names for a list of policy numbers (None where not found)"""
+    parsed = []
+    for policy_number in policy_numbers:
+        try:
+            parsed.append(parse_policy_number(policy_number))
+        except ValueError:
+            parsed.append(None)
+    return POLICY_INDEX.get_holders(parsed)
 
 def get_claim_guidance(insurance_type):
     """Get guidance for what constitutes a valid claim"""
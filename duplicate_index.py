@@ -0,0 +1,224 @@
+"""Near-duplicate detection over claim descriptions (MinHash + LSH).
+
+A claim resubmitted with small edits shares most of its character 5-grams
+(shingles) with the original. Each description is reduced to a MinHash
+signature whose agreement with another signature estimates the Jaccard
+similarity of their shingle sets, and signatures are split into bands for
+locality-sensitive hashing: two descriptions become candidates when any band
+matches exactly, which happens with high probability above roughly
+(1/bands)^(1/rows) similarity and rarely below it. Candidates are then checked
+against the stored signatures, so lookups touch a handful of claims instead of
+all of them.
+
+Band keys are kept in per-band sorted arrays (binary search) plus a small dict
+buffer for recent additions that is merged in periodically, which keeps memory
+at a few hundred bytes per claim and lookups logarithmic with millions of
+claims. Signatures are stored as 16-bit minhashes (b-bit MinHash). The claim
+history loaded at startup is merged in once, after all of it is read (see
+incremental_index).
+"""
+import re
+import threading
+
+import numpy as np
+
+import metrics
+from incremental_index import IncrementalIndex, reserve
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.7
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text):
+    return " ".join(_WORD.findall(text.lower()))
+
+
+class NearDuplicateIndex(IncrementalIndex):
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS,
+                 shingle_size=SHINGLE_SIZE, merge_every=10000, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if not 1 <= shingle_size <= 8:
+            raise ValueError("shingle_size must be between 1 and 8")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._band_multipliers = rng.integers(1, 2**63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        self._shifts = np.arange(shingle_size, dtype=np.uint64) * np.uint64(8)
+        super().__init__(bands, merge_every)
+
+    def _clear(self):
+        super()._clear()
+        self._ids = []
+        self._signatures = np.empty((1024, self.num_perm), dtype=np.uint16)
+        self._band_keys = np.empty((1024, self.bands), dtype=np.uint32)
+        self._sorted_keys = [np.empty(0, dtype=np.uint32) for _ in range(self.bands)]
+        self._sorted_positions = [np.empty(0, dtype=np.int64) for _ in range(self.bands)]
+
+    def __len__(self):
+        return len(self._ids)
+
+    # --- signatures -----------------------------------------------------------
+
+    def _shingles(self, text):
+        data = np.frombuffer(normalize(text).encode("utf-8"), dtype=np.uint8)
+        if data.size == 0:
+            return None
+        if data.size < self.shingle_size:
+            data = np.pad(data, (0, self.shingle_size - data.size))
+        data = data.astype(np.uint64)
+        count = data.size - self.shingle_size + 1
+        # Pack each shingle's bytes into one integer
+        packed = data[:count].copy()
+        for offset in range(1, self.shingle_size):
+            packed |= data[offset:offset + count] << self._shifts[offset]
+        # Repeated shingles are left in: they don't change a minimum
+        return packed
+
+    def signature(self, text):
+        """(16-bit signature, band keys) for a description, or None if it has no words"""
+        shingles = self._shingles(text)
+        if shingles is None:
+            return None
+        with np.errstate(over="ignore"):
+            mixed = shingles * np.uint64(0x9E3779B97F4A7C15)
+            mixed ^= mixed >> np.uint64(29)
+            # Multiply-shift hashing: one independent hash per permutation
+            hashes = (self._a[:, None] * mixed[None, :] + self._b[:, None]) >> np.uint64(32)
+            minima = hashes.min(axis=1)
+            band_keys = (minima.reshape(self.bands, self.rows) * self._band_multipliers).sum(
+                axis=1, dtype=np.uint64) >> np.uint64(32)
+        return (minima & np.uint64(0xFFFF)).astype(np.uint16), band_keys.astype(np.uint32)
+
+    # --- updates --------------------------------------------------------------
+
+    def _append(self, claim_ids, signatures, band_keys, buffered=True):
+        start = len(self._ids)
+        end = start + len(claim_ids)
+        self._signatures = reserve(self._signatures, end)
+        self._band_keys = reserve(self._band_keys, end)
+        self._ids.extend(claim_ids)
+        self._signatures[start:end] = signatures
+        self._band_keys[start:end] = band_keys
+        if buffered:
+            self._buffer_keys(start, band_keys.tolist())
+
+    def _merge(self):
+        """Move buffered positions into the sorted arrays (a linear merge of two sorted runs)"""
+        count = len(self._ids)
+        new_positions = np.arange(self._merged, count, dtype=np.int64)
+        for band in range(self.bands):
+            new_keys = self._band_keys[self._merged:count, band]
+            order = np.argsort(new_keys, kind="stable")
+            keys = np.concatenate([self._sorted_keys[band], new_keys[order]])
+            positions = np.concatenate([self._sorted_positions[band], new_positions[order]])
+            merged_order = np.argsort(keys, kind="stable")
+            self._sorted_keys[band] = keys[merged_order]
+            self._sorted_positions[band] = positions[merged_order]
+        self._merged_all(count)
+
+    def add(self, claim_id, description):
+        """Index a claim; returns the earlier claims it nearly duplicates (see query)"""
+        signature = self.signature(description)
+        if signature is None:
+            return []
+        with self._lock, metrics.span("duplicates.add"):
+            matches = self._query(signature, exclude=claim_id)
+            self._append([claim_id], signature[0][None, :], signature[1][None, :])
+        if matches:
+            metrics.increment("near_duplicate_claims")
+        return matches
+
+    def _prepare(self, rows):
+        # Signatures of (claim_id, description) rows, computed outside the lock
+        indexed, signatures, band_keys = [], [], []
+        for claim_id, text in rows:
+            signature = self.signature(text)
+            if signature is not None:
+                indexed.append(claim_id)
+                signatures.append(signature[0])
+                band_keys.append(signature[1])
+        return indexed, signatures, band_keys
+
+    def _load_rows(self, prepared):
+        indexed, signatures, band_keys = prepared
+        if indexed:
+            self._append(indexed, np.stack(signatures), np.stack(band_keys), buffered=False)
+
+    def add_many(self, claim_ids, descriptions):
+        """Index many claims without checking them"""
+        return self.load([list(zip(claim_ids, descriptions))])
+
+    # --- lookups --------------------------------------------------------------
+
+    def _candidates(self, band_keys):
+        candidates = set()
+        for band, key in enumerate(band_keys.tolist()):
+            sorted_keys = self._sorted_keys[band]
+            # Searched as a uint32 array; a Python int would make numpy convert sorted_keys
+            needle = band_keys[band:band + 1]
+            lo = np.searchsorted(sorted_keys, needle, side="left")[0]
+            hi = np.searchsorted(sorted_keys, needle, side="right")[0]
+            if hi > lo:
+                candidates.update(self._sorted_positions[band][lo:hi].tolist())
+            candidates.update(self._buffer[band].get(key, ()))
+        return candidates
+
+    def _query(self, signature, exclude=None, limit=5):
+        signature, band_keys = signature
+        candidates = np.fromiter(self._candidates(band_keys), dtype=np.int64)
+        if candidates.size == 0:
+            return []
+        similarity = (self._signatures[candidates] == signature).mean(axis=1)
+        keep = similarity >= self.threshold
+        matches = sorted(
+            ((self._ids[position], float(score)) for position, score in zip(candidates[keep], similarity[keep])),
+            key=lambda match: -match[1],
+        )
+        return [match for match in matches if match[0] != exclude][:limit]
+
+    def query(self, description, limit=5):
+        """Indexed claims whose description is at least `threshold` similar, as
+        (claim_id, estimated Jaccard similarity), most similar first"""
+        signature = self.signature(description)
+        if signature is None:
+            return []
+        with self._lock:
+            return self._query(signature, limit=limit)
+
+    def query_many(self, descriptions, limit=5):
+        """query() for many descriptions; signatures are computed outside the lock"""
+        signatures = [self.signature(text) for text in descriptions]
+        with self._lock:
+            return [self._query(signature, limit=limit) if signature is not None else []
+                    for signature in signatures]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index(store=None, batch_size=10000):
+    """The process-wide index; the first call starts loading store's claim history
+    on a background thread, so submissions are checked while it fills up"""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+        _index = NearDuplicateIndex()
+        metrics.register_gauge("duplicate_index_size", _index.__len__)
+        index = _index
+
+    if store is not None:
+        index.load_in_background(store.iter_descriptions(batch_size), "duplicate-index-load")
+    return index
@@ -1,8 +1,42 @@
-from transformers import pipeline
+import logging
+import os
+import queue
 import random
+import re
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import model_registry
+import metrics
+from micro_batcher import BatcherFull, MicroBatcher
+from result_cache import ResultCache, content_hash
 
-# Load GPT-2 model
-generator = pipeline("text-generation", model="gpt2")
+logger = logging.getLogger(__name__)
+
+# "template" answers from the keyword templates below; "model" generates with GPT-2
+# and falls back to the templates when generation misses the latency budget
+GENAI_MODE = os.environ.get("GENAI_MODE", "template").lower()
+GENAI_MAX_NEW_TOKENS = int(os.environ.get("GENAI_MAX_NEW_TOKENS", "48"))
+GENAI_LATENCY_BUDGET = float(os.environ.get("GENAI_LATENCY_BUDGET", "2.0"))
+GENAI_MAX_BATCH = int(os.environ.get("GENAI_MAX_BATCH", "8"))
+GENAI_BATCH_WAIT_MS = float(os.environ.get("GENAI_BATCH_WAIT_MS", "20"))
+# Requests beyond this many waiting for the model fall back to the templates at once
+GENAI_MAX_PENDING = int(os.environ.get("GENAI_MAX_PENDING", str(GENAI_MAX_BATCH * 8)))
+GENAI_CACHE_SIZE = int(os.environ.get("GENAI_CACHE_SIZE", "512"))
+
+# GPT-2 is loaded on first use, not at import
+def _load_generator():
+    from transformers import pipeline
+    model_registry.configure_torch()
+    generator = pipeline("text-generation", model="gpt2")
+    # Batched generation needs a pad token (GPT-2 has none) and left padding
+    generator.tokenizer.pad_token_id = generator.model.config.eos_token_id
+    generator.tokenizer.padding_side = "left"
+    return generator
+
+model_registry.register("gpt2", _load_generator)
+
+def get_generator():
+    return model_registry.get("gpt2")
 
 # Enhanced insurance-specific guidance templates
 INSURANCE_GUIDANCE = {
@@ -77,12 +111,262 @@ INSURANCE_GUIDANCE = {
     }
 }
 
+# Generated guidance keyed by insurance type + normalized description, so common
+# incidents are generated once
+guidance_cache = ResultCache(max_entries=GENAI_CACHE_SIZE)
+metrics.register_gauge("genai_cache_hit_rate", lambda: guidance_cache.stats()["hit_rate"])
+
+# Cache key -> [future, number of callers waiting on it]
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def normalize_description(description):
+    """Lowercase words only, so trivially different wordings share a cache entry"""
+    return " ".join(re.findall(r"[a-z0-9]+", description.lower()))
+
+def _guidance_key(insurance_type, description):
+    text = f"{insurance_type.lower()}\n{normalize_description(description)}"
+    return content_hash(text.encode("utf-8"), namespace=f"gpt2-{GENAI_MAX_NEW_TOKENS}")
+
+def _build_prompt(insurance_type, description):
+    return (
+        f"Insurance claim assistant.\n"
+        f"{insurance_type.capitalize()} insurance claim: {description.strip()[:500]}\n"
+        f"Advice for the claimant:"
+    )
+
+def _clean_generation(text):
+    """Collapse whitespace and drop a trailing unfinished sentence"""
+    text = " ".join(text.split())
+    end = max(text.rfind("."), text.rfind("!"), text.rfind("?"))
+    if end > 0:
+        text = text[:end + 1]
+    return text
+
+class _BatchStreamer:
+    """Streamer for a batched generate() call: sends each row's new text to its own queue.
+
+    generate() calls put() with the prompt ids first and then once per step with
+    the next token of every row. Rows whose queue is None aren't streamed.
+    """
+
+    def __init__(self, tokenizer, queues):
+        self.tokenizer = tokenizer
+        self.queues = queues
+        self.tokens = [[] for _ in queues]
+        self.sent = [0] * len(queues)
+        self.prompt_seen = False
+
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        for row, token in enumerate(value.reshape(-1).tolist()):
+            if self.queues[row] is None:
+                continue
+            self.tokens[row].append(token)
+            text = self.tokenizer.decode(self.tokens[row], skip_special_tokens=True)
+            # Hold back a partly decoded multi-byte character until it is complete
+            if text.endswith("\ufffd") or len(text) <= self.sent[row]:
+                continue
+            self.queues[row].put(text[self.sent[row]:])
+            self.sent[row] = len(text)
+
+    def end(self):
+        pass
+
+def _generate_batch(items):
+    """Generate for a batch of (cache key, prompt, token queue or None) in one pipeline call"""
+    prompts = [prompt for _, prompt, _ in items]
+    queues = [token_queue for _, _, token_queue in items]
+    try:
+        with model_registry.serving("gpt2") as generator, metrics.span("genai.generate"):
+            streamer = None
+            if any(token_queue is not None for token_queue in queues):
+                streamer = _BatchStreamer(generator.tokenizer, queues)
+            outputs = generator(
+                prompts,
+                max_new_tokens=GENAI_MAX_NEW_TOKENS,
+                do_sample=False,
+                batch_size=len(prompts),
+                return_full_text=False,
+                pad_token_id=generator.tokenizer.pad_token_id,
+                streamer=streamer,
+            )
+        metrics.increment("genai_batches")
+        metrics.increment("genai_generated", len(prompts))
+
+        results = []
+        for (key, _, _), output in zip(items, outputs):
+            text = _clean_generation(output[0]["generated_text"])
+            # Cached even when the caller already fell back, so the next one gets it
+            guidance_cache.put(key, text)
+            results.append(text)
+        return results
+    finally:
+        # None marks the end of a stream, also when generation failed; sent after
+        # caching so a finished stream finds its cleaned text in the cache
+        for token_queue in queues:
+            if token_queue is not None:
+                token_queue.put(None)
+
+_batcher = MicroBatcher(_generate_batch, max_batch=GENAI_MAX_BATCH,
+                        max_wait=GENAI_BATCH_WAIT_MS / 1000, name="genai-batcher",
+                        max_pending=GENAI_MAX_PENDING)
+metrics.register_gauge("genai_pending", _batcher.pending)
+
+def _submit_generation(key, prompt):
+    """Future for the generation of key; raises BatcherFull when the model is overloaded"""
+    # Identical requests already being generated share one future
+    with _in_flight_lock:
+        entry = _in_flight.get(key)
+        if entry is not None:
+            entry[1] += 1
+            return entry[0]
+        future = _batcher.submit((key, prompt, None))
+        _in_flight[key] = [future, 1]
+    # Registered outside the lock: an already finished future runs the callback right here
+    future.add_done_callback(lambda done: _forget_in_flight(key, done))
+    return future
+
+def _forget_in_flight(key, future):
+    with _in_flight_lock:
+        entry = _in_flight.get(key)
+        if entry is not None and entry[0] is future:
+            del _in_flight[key]
+
+def _give_up(key, future):
+    """A caller stopped waiting; cancel the generation if nobody else is waiting for it"""
+    with _in_flight_lock:
+        entry = _in_flight.get(key)
+        if entry is None or entry[0] is not future:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+    # Only succeeds while the request is still queued; cancelled requests are skipped
+    future.cancel()
+
+def generate_guidance(insurance_type, description, timeout=None):
+    """GPT-2 guidance for a claim, or None if it isn't ready within the latency budget.
+
+    Concurrent calls are batched into one generator call; results are cached.
+    """
+    key = _guidance_key(insurance_type, description)
+    cached = guidance_cache.get(key)
+    if cached is not None:
+        metrics.increment("genai_requests", result="cache_hit")
+        return cached or None
+
+    try:
+        future = _submit_generation(key, _build_prompt(insurance_type, description))
+    except BatcherFull:
+        metrics.increment("genai_requests", result="rejected")
+        return None
+    try:
+        text = future.result(timeout=GENAI_LATENCY_BUDGET if timeout is None else timeout)
+    except FutureTimeoutError:
+        _give_up(key, future)
+        metrics.increment("genai_requests", result="timeout")
+        return None
+    except Exception as e:
+        logger.warning("GPT-2 guidance generation failed: %s", e)
+        metrics.increment("genai_requests", result="error")
+        return None
+    metrics.increment("genai_requests", result="generated")
+    return text or None
+
+def _stream_generation(insurance_type, description):
+    """Yield GPT-2 guidance text as it is generated; nothing if no token arrives in time"""
+    key = _guidance_key(insurance_type, description)
+    cached = guidance_cache.get(key)
+    if cached is not None:
+        metrics.increment("genai_requests", result="cache_hit")
+        if cached:
+            yield cached
+        return
+
+    token_queue = queue.Queue()
+    try:
+        future = _batcher.submit((key, _build_prompt(insurance_type, description), token_queue))
+    except BatcherFull:
+        metrics.increment("genai_requests", result="rejected")
+        return
+    streamed = False
+    while True:
+        try:
+            # The budget applies to the first token and to each gap between tokens
+            chunk = token_queue.get(timeout=GENAI_LATENCY_BUDGET)
+        except queue.Empty:
+            # Nobody else reads this stream, so a request still queued is dropped
+            future.cancel()
+            break
+        if chunk is None:
+            break
+        if not streamed:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+        streamed = True
+        yield chunk
+    metrics.increment("genai_requests", result="streamed" if streamed else "timeout")
+
+def stream_genai_response(insurance_type, description):
+    """Yield the guidance summary for a claim in pieces as it becomes available.
+
+    In model mode these are GPT-2 tokens as they are generated, or the template
+    when the first token misses the latency budget; otherwise the template in
+    one piece. The full response is the joined pieces followed by
+    get_next_steps_text(), which needs no generation and can be shown first.
+    """
+    if GENAI_MODE == "model":
+        streamed = False
+        for chunk in _stream_generation(insurance_type, description):
+            streamed = True
+            yield chunk
+        if streamed:
+            return
+    yield template_response(insurance_type, description)
+
+def final_guidance_summary(insurance_type, description, streamed_text):
+    """The summary to keep once stream_genai_response() has ended.
+
+    Streamed tokens are raw generator output: when generation completed, its
+    cleaned result is in the cache; when the stream stopped early (a token gap
+    over the budget) the unfinished sentence is dropped, or the template is used
+    if nothing is left.
+    """
+    if GENAI_MODE != "model":
+        return streamed_text
+    template = template_response(insurance_type, description)
+    if streamed_text == template:
+        return template
+    cached = guidance_cache.get(_guidance_key(insurance_type, description))
+    if cached:
+        return cached
+    return _clean_generation(streamed_text) or template
+
+def get_guidance_cache_stats():
+    return guidance_cache.stats()
+
+def get_next_steps_text(insurance_type):
+    next_steps = INSURANCE_GUIDANCE.get(insurance_type.lower(), {}).get("next_steps", [])
+    if not next_steps:
+        return ""
+    return "\n\n**Next Steps:**\n" + "\n".join(next_steps[:3])  # Show first 3 steps
+
+@metrics.timed("genai.response")
 def get_genai_response(insurance_type, description):
+    if GENAI_MODE == "model":
+        generated = generate_guidance(insurance_type, description)
+        if generated:
+            return generated + get_next_steps_text(insurance_type)
+    return template_response(insurance_type, description) + get_next_steps_text(insurance_type)
+
+def template_response(insurance_type, description):
+    """Keyword-picked summary line for a claim (without next steps)"""
     insurance_type = insurance_type.lower()
     
-    # Get insurance-specific guidance
-    guidance = INSURANCE_GUIDANCE.get(insurance_type, {})
-    
     # Generate contextual response
     if insurance_type == "auto":
         context = "Auto Insurance Claim Guidance"
@@ -115,13 +399,9 @@ def get_genai_response(insurance_type, description):
         context = "Insurance Claim Guidance"
         response = "📋 Claim submitted successfully. Follow the provided guidance for processing."
     
-    # Add next steps
-    next_steps = guidance.get("next_steps", [])
-    if next_steps:
-        response += "\n\n**Next Steps:**\n" + "\n".join(next_steps[:3])  # Show first 3 steps
-    
     return response
 
+@metrics.timed("genai.guidance")
 def get_claim_guidance(insurance_type):
     """Get comprehensive guidance for a specific insurance type"""
     guidance = INSURANCE_GUIDANCE.get(insurance_type.lower(), {})
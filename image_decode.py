@@ -0,0 +1,101 @@
+"""Bounded-memory decoding of uploaded photos for the classifier.
+
+Phone photos are 12-50 MP but the model only needs a 224x224 crop. Instead of
+decoding at full resolution and resizing afterwards, JPEGs are decoded with
+Pillow's draft mode, which lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding.
+Other formats are reduced right after decoding. EXIF orientation is applied so
+rotated phone photos are classified upright, and preprocessed pixels are
+written straight into a per-thread batch buffer that is reused across calls.
+
+decode_image() + fill_batch() compute the same thing as vision_module.preprocess
+(Resize(256), CenterCrop(224), ToTensor, Normalize).
+"""
+import io
+import math
+import os
+import threading
+
+import numpy as np
+import torch
+from PIL import Image, ImageOps
+
+RESIZE_TO = 256
+CROP_SIZE = 224
+MEAN = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+STD = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+
+# Refuse to decode anything larger than this (decompression bombs)
+MAX_SOURCE_PIXELS = int(os.environ.get("IMAGE_MAX_SOURCE_PIXELS", str(100_000_000)))
+# Working images are reduced to at most this many pixels before any further processing
+MAX_DECODE_PIXELS = int(os.environ.get("IMAGE_MAX_DECODE_PIXELS", str(4_000_000)))
+
+_buffers = threading.local()
+
+
+def decode_image(data, size=RESIZE_TO, max_pixels=MAX_DECODE_PIXELS):
+    """Decode image bytes to an upright RGB image whose shorter side is size"""
+    image = Image.open(io.BytesIO(data))
+    width, height = image.size
+    if width * height > MAX_SOURCE_PIXELS:
+        raise ValueError(f"Image too large ({width}x{height})")
+
+    # For JPEGs, decode at the smallest 1/2^n scale that keeps the shorter side >= size
+    scale = size / min(width, height)
+    if scale < 1:
+        image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+
+    # Palette and other exotic modes can't be reduced directly
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGB")
+
+    # Cap the working size for formats draft() can't shrink
+    factor = 1
+    while (image.width // factor) * (image.height // factor) > max_pixels \
+            and min(image.width, image.height) // (factor * 2) >= size:
+        factor *= 2
+    if factor > 1:
+        image = image.reduce(factor)
+
+    image = ImageOps.exif_transpose(image)
+    return resize_shorter_side(image, size)
+
+
+def resize_shorter_side(image, size=RESIZE_TO):
+    """Image as RGB, resized so its shorter side is size (as transforms.Resize(size) does)"""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    width, height = image.size
+    if width <= height:
+        new_size = (size, int(size * height / width))
+    else:
+        new_size = (int(size * width / height), size)
+    if new_size != image.size:
+        image = image.resize(new_size, Image.BILINEAR)
+    return image
+
+
+def batch_buffer(batch_size):
+    """A (batch_size, 3, CROP_SIZE, CROP_SIZE) float tensor reused by this thread"""
+    buffer = getattr(_buffers, "batch", None)
+    if buffer is None or buffer.shape[0] < batch_size:
+        buffer = torch.empty(batch_size, 3, CROP_SIZE, CROP_SIZE)
+        _buffers.batch = buffer
+    return buffer[:batch_size]
+
+
+def fill_batch(images):
+    """Center-crop and normalize decoded images into the reusable batch buffer.
+
+    The returned tensor is overwritten by this thread's next call; don't keep it.
+    """
+    batch = batch_buffer(len(images))
+    for i, image in enumerate(images):
+        width, height = image.size
+        left = int(round((width - CROP_SIZE) / 2.0))
+        top = int(round((height - CROP_SIZE) / 2.0))
+        crop = image.crop((left, top, left + CROP_SIZE, top + CROP_SIZE))
+        pixels = torch.from_numpy(np.array(crop, dtype=np.uint8))
+        batch[i].copy_(pixels.permute(2, 0, 1))
+    batch.div_(255).sub_(MEAN).div_(STD)
+    return batch
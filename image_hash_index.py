@@ -0,0 +1,207 @@
+"""Perceptual-hash index of analyzed claim images, to catch reused evidence.
+
+Every analyzed image gets a 64-bit difference hash (dHash): the image is
+shrunk to 9x8 grayscale and each bit records whether a pixel is brighter than
+its right neighbour. Re-encoding, resizing, brightness changes and small
+edits flip only a few bits, so a photo reused for another claim is found as a
+stored hash within a small Hamming distance (IMAGE_REUSE_MAX_DISTANCE, default
+6 of 64 bits).
+
+Lookups use multi-index hashing: the hash is split into four 16-bit chunks and
+each chunk has its own table. If two hashes differ in at most r bits, some
+chunk differs in at most r // 4 bits (pigeonhole), so probing each table with
+the query chunk and its variants within r // 4 bits finds every match while
+only touching a few buckets. Tables are CSR arrays (bucket offsets + positions
+sorted by chunk), with a dict buffer for recent additions that is merged in
+periodically, so an image costs ~24 bytes of index and lookups stay in the
+millisecond range with tens of millions of images.
+
+Hashes are persisted in the claim database (image_hashes table) and loaded
+back on a background thread at startup. The stored hashes become searchable
+together, with one merge once the whole history is read (see incremental_index).
+"""
+import itertools
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+import metrics
+from incremental_index import IncrementalIndex, reserve
+
+CHUNKS = 4
+CHUNK_BITS = 16
+MAX_DISTANCE = int(os.environ.get("IMAGE_REUSE_MAX_DISTANCE", "6"))
+
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+_POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << CHUNK_BITS)], dtype=np.uint8)
+
+
+def dhash(image):
+    """64-bit difference hash of a PIL image"""
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.BOX), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distances(hashes, value):
+    """Bit differences between each of an array of uint64 hashes and value"""
+    diff = hashes ^ np.uint64(value)
+    distances = np.zeros(len(diff), dtype=np.uint8)
+    for chunk in range(CHUNKS):
+        distances += _POPCOUNT16[(diff >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(_CHUNK_MASK)]
+    return distances
+
+
+def _chunks(value):
+    return [(value >> (chunk * CHUNK_BITS)) & _CHUNK_MASK for chunk in range(CHUNKS)]
+
+
+class ImageHashIndex(IncrementalIndex):
+    def __init__(self, max_distance=MAX_DISTANCE, store=None, merge_every=50000):
+        """store, if given, is a ClaimStore that new hashes are written to"""
+        self.max_distance = max_distance
+        self.store = store
+        # Flip masks for every chunk variant within max_distance // CHUNKS bits
+        radius = max_distance // CHUNKS
+        self._probe_masks = [
+            sum(1 << bit for bit in bits)
+            for flips in range(radius + 1)
+            for bits in itertools.combinations(range(CHUNK_BITS), flips)
+        ]
+        super().__init__(CHUNKS, merge_every)
+
+    def _clear(self):
+        super()._clear()
+        self._hashes = np.empty(1024, dtype=np.uint64)
+        self._owners = np.empty(1024, dtype=np.int32)
+        self._count = 0
+        # Owners are indexes into _claims, so each claim's ids are stored once
+        self._claims = []
+        self._claim_numbers = {}
+        self._offsets = [np.zeros((1 << CHUNK_BITS) + 1, dtype=np.int64) for _ in range(CHUNKS)]
+        self._positions = [np.empty(0, dtype=np.int32) for _ in range(CHUNKS)]
+
+    def __len__(self):
+        return self._count
+
+    # --- updates --------------------------------------------------------------
+
+    def _owner(self, claim_id, policy_number):
+        number = self._claim_numbers.get(claim_id)
+        if number is None:
+            number = self._claim_numbers[claim_id] = len(self._claims)
+            self._claims.append((claim_id, policy_number))
+        return number
+
+    def _append(self, owners, hashes, buffered=True):
+        start = self._count
+        end = start + len(hashes)
+        self._hashes = reserve(self._hashes, end)
+        self._owners = reserve(self._owners, end)
+        self._hashes[start:end] = hashes
+        self._owners[start:end] = owners
+        self._count = end
+        if buffered:
+            self._buffer_keys(start, [_chunks(value) for value in hashes])
+
+    def _merge(self):
+        """Rebuild the CSR tables over every hash (a radix sort of 16-bit keys per table)"""
+        hashes = self._hashes[:self._count]
+        for chunk in range(CHUNKS):
+            keys = ((hashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(_CHUNK_MASK)).astype(np.uint16)
+            self._positions[chunk] = np.argsort(keys, kind="stable").astype(np.int32)
+            counts = np.bincount(keys, minlength=1 << CHUNK_BITS)
+            self._offsets[chunk][1:] = np.cumsum(counts)
+        self._merged_all(self._count)
+
+    def _load_rows(self, rows):
+        # (claim_id, policy_number, hash) rows
+        owners = [self._owner(claim_id, policy_number) for claim_id, policy_number, _ in rows]
+        self._append(owners, [value for _, _, value in rows], buffered=False)
+
+    def add_many(self, rows):
+        """Index (claim_id, policy_number, hash) rows without checking them"""
+        return self.load([rows])
+
+    def check_and_add(self, claim_id, policy_number, images):
+        """Look up a claim's (file_name, hash) images against other claims, then index them.
+
+        Returns one list of matches (see find) per image.
+        """
+        with self._lock, metrics.span("image_reuse.lookup"):
+            matches = [self._find(value, exclude=claim_id) for _, value in images]
+            owner = self._owner(claim_id, policy_number)
+            self._append([owner] * len(images), [value for _, value in images])
+        reused = sum(1 for found in matches if found)
+        if reused:
+            metrics.increment("reused_images", reused)
+        if self.store is not None and images:
+            self.store.add_image_hashes(
+                [(claim_id, policy_number, file_name, value) for file_name, value in images]
+            )
+        return matches
+
+    # --- lookups --------------------------------------------------------------
+
+    def _candidates(self, value):
+        found = []
+        for chunk, key in enumerate(_chunks(value)):
+            offsets, positions, buffer = self._offsets[chunk], self._positions[chunk], self._buffer[chunk]
+            for mask in self._probe_masks:
+                probe = key ^ mask
+                start, end = offsets[probe], offsets[probe + 1]
+                if end > start:
+                    found.append(positions[start:end])
+                if probe in buffer:
+                    found.append(np.array(buffer[probe], dtype=np.int32))
+        if not found:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def _find(self, value, exclude=None, limit=5):
+        candidates = self._candidates(value)
+        if candidates.size == 0:
+            return []
+        distances = hamming_distances(self._hashes[candidates], value)
+        keep = distances <= self.max_distance
+        matches = {}
+        for position, distance in sorted(zip(candidates[keep].tolist(), distances[keep].tolist()),
+                                         key=lambda match: match[1]):
+            claim_id, policy_number = self._claims[self._owners[position]]
+            if claim_id != exclude and claim_id not in matches:
+                matches[claim_id] = {"claim_id": claim_id, "policy_number": policy_number, "distance": distance}
+        return list(matches.values())[:limit]
+
+    def find(self, value, limit=5):
+        """Claims with an indexed image within max_distance bits of hash value, as
+        {"claim_id", "policy_number", "distance"} dicts, closest first"""
+        with self._lock:
+            return self._find(value, limit=limit)
+
+    def find_many(self, values, limit=5):
+        with self._lock:
+            return [self._find(value, limit=limit) for value in values]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_image_index(store=None, batch_size=50000):
+    """The process-wide index, persisted in store (the claim store by default);
+    the first call loads the stored hashes on a background thread"""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            return _index
+        if store is None:
+            from claim_store import get_store
+            store = get_store()
+        _index = ImageHashIndex(store=store)
+        metrics.register_gauge("image_hash_index_size", _index.__len__)
+        index = _index
+
+    index.load_in_background(store.iter_image_hashes(batch_size), "image-hash-index-load")
+    return index
@@ -0,0 +1,88 @@
+"""Shared bookkeeping of the in-memory claim indexes (duplicate_index, image_hash_index).
+
+Both keep their entries in append-only arrays plus one lookup table per key
+(band or hash chunk). Lookup tables are rebuilt by a merge; live additions also
+go into small per-table dict buffers until the next merge, while bulk loads
+(the history read at startup) skip the buffers and are merged once at the end.
+clear() bumps a generation counter so a history load that is still running
+stops instead of filling the cleared index.
+"""
+import threading
+
+import numpy as np
+
+
+def reserve(array, size):
+    """array, grown (doubling) to hold at least size rows along its first axis"""
+    capacity = len(array)
+    if size <= capacity:
+        return array
+    return np.resize(array, (max(size, capacity * 2),) + array.shape[1:])
+
+
+class IncrementalIndex:
+    """Base class; subclasses implement _clear() (calling super), _merge() and
+    _load_rows(), and may override _prepare()"""
+
+    def __init__(self, tables, merge_every):
+        self.merge_every = merge_every
+        self._tables = tables
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._clear()
+
+    def _clear(self):
+        # Positions [0, _merged) are in the lookup tables; later live additions are also in
+        # the per-table buffers, bulk-loaded ones only become searchable at the next merge
+        self._merged = 0
+        self._buffered = 0
+        self._buffer = [{} for _ in range(self._tables)]
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+            self._generation += 1
+
+    def _buffer_keys(self, start, keys):
+        """Make positions start, start + 1, ... searchable under their per-table keys"""
+        self._buffered += len(keys)
+        if self._buffered >= self.merge_every:
+            self._merge()
+            return
+        for position, row in enumerate(keys, start):
+            for table, key in enumerate(row):
+                self._buffer[table].setdefault(key, []).append(position)
+
+    def _merged_all(self, count):
+        for buffer in self._buffer:
+            buffer.clear()
+        self._merged = count
+        self._buffered = 0
+
+    def _prepare(self, rows):
+        """Per-batch work done outside the lock; the result is passed to _load_rows()"""
+        return rows
+
+    def load(self, batches):
+        """Index batches of rows without checking them, with a single merge at the end
+        (e.g. the stored history at startup).
+
+        Stops, returning False, if the index is cleared in the meantime.
+        """
+        with self._lock:
+            generation = self._generation
+        for rows in batches:
+            prepared = self._prepare(rows)
+            with self._lock:
+                if self._generation != generation:
+                    return False
+                self._load_rows(prepared)
+        with self._lock:
+            if self._generation != generation:
+                return False
+            self._merge()
+        return True
+
+    def load_in_background(self, batches, name):
+        """load() on a daemon thread, so the index is usable while it fills up"""
+        threading.Thread(target=self.load, args=(batches,), name=name, daemon=True).start()
@@ -0,0 +1,73 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over several named keyword lists.
+
+    Compiled once from a mapping of category -> keywords. scan() walks the
+    text a single time and returns every category with at least one keyword
+    occurring as a substring, so the cost depends on the text length and not
+    on how many keywords there are. Overlapping matches are reported, giving
+    the same answer as `any(keyword in text for keyword in keywords)` per category.
+    """
+
+    def __init__(self, categories):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [frozenset()]
+        self._keywords = {}
+
+        outputs = [set()]
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if not keyword:
+                    continue
+                state = 0
+                for char in keyword:
+                    next_state = self._goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(self._goto)
+                        self._goto[state][char] = next_state
+                        self._goto.append({})
+                        self._fail.append(0)
+                        outputs.append(set())
+                    state = next_state
+                outputs[state].add(category)
+                self._keywords.setdefault(category, set()).add(keyword)
+
+        # Breadth-first pass to set failure links and merge outputs along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                outputs[next_state] |= outputs[self._fail[next_state]]
+
+        self._output = [frozenset(out) for out in outputs]
+
+    @property
+    def categories(self):
+        return set(self._keywords)
+
+    def keywords(self, category):
+        return frozenset(self._keywords.get(category, ()))
+
+    def scan(self, text):
+        """Return the set of categories whose keywords occur in the (lowercased) text"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        hits = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                hits |= output[state]
+        return hits
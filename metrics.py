@@ -0,0 +1,276 @@
+"""Per-stage timing, counters and gauges for the claim pipeline.
+
+Stages (policy lookup, keyword rules, image decode, preprocess, forward pass,
+GenAI response, queue wait, ...) are timed with span() or @timed() into
+fixed-bucket histograms, so a slow submission can be traced to the stage that
+took the time. Counters count events; gauges are read from callbacks (queue
+depth, cache hit rates, model load times) when metrics are exported.
+
+Metrics are off unless METRICS_ENABLED=1. When off, span() returns a shared
+no-op and observe()/increment() return after one flag check, so leaving the
+instrumentation in the hot paths costs next to nothing.
+
+Export with to_prometheus() (text exposition format) or snapshot()/to_json().
+The Settings page shows both; set METRICS_PORT to also serve /metrics for a
+Prometheus scraper.
+"""
+import functools
+import json
+import os
+import threading
+import time
+
+ENABLED = os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+PREFIX = "claim_"
+# Upper bounds in seconds; covers a dict lookup up to a cold model load
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_server = None
+
+
+class _Histogram:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolated within its bucket (as Prometheus does)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.buckets):
+            if count and seen + count >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = bound
+        return self.max
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+
+def span(stage):
+    """Context manager timing one run of stage"""
+    if not ENABLED:
+        return _NOOP_SPAN
+    return _Span(stage)
+
+
+def timed(stage):
+    """Decorator timing every call of the function as stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def observe(stage, seconds):
+    """Record a duration for stage"""
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = _Histogram()
+        histogram.add(seconds)
+
+
+def increment(name, value=1, **labels):
+    """Add value to the counter name, e.g. increment("claims_validated", status="approved")"""
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register_gauge(name, callback, label=None):
+    """Report callback() as gauge name at export time.
+
+    callback returns a number, or a dict of {label value: number} when label
+    names the label those values are reported under.
+    """
+    with _lock:
+        _gauges[name] = (callback, label)
+
+
+def reset():
+    """Drop recorded timings and counters (gauges stay registered)"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _read_gauges():
+    with _lock:
+        gauges = dict(_gauges)
+    values = {}
+    for name, (callback, label) in gauges.items():
+        try:
+            value = callback()
+        except Exception:
+            # A gauge whose source isn't available yet (e.g. no model loaded) is skipped
+            continue
+        if isinstance(value, dict):
+            values[name] = (label, {str(k): float(v) for k, v in value.items()})
+        elif value is not None:
+            values[name] = (None, float(value))
+    return values
+
+
+def snapshot():
+    """All metrics as a JSON-serializable dict"""
+    with _lock:
+        stages = {
+            stage: {
+                "count": h.count,
+                "total_s": h.total,
+                "mean_ms": h.total / h.count * 1000 if h.count else 0.0,
+                "p50_ms": h.quantile(0.5) * 1000,
+                "p95_ms": h.quantile(0.95) * 1000,
+                "p99_ms": h.quantile(0.99) * 1000,
+                "max_ms": h.max * 1000,
+            }
+            for stage, h in sorted(_histograms.items())
+        }
+        counters = {}
+        for (name, labels), value in sorted(_counters.items()):
+            if not labels:
+                counters[name] = value
+            else:
+                counters.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+    gauges = {name: value for name, (_, value) in _read_gauges().items()}
+    return {"enabled": ENABLED, "stages": stages, "counters": counters, "gauges": gauges}
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=2)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        histograms = {stage: (h.count, h.total, list(h.buckets)) for stage, h in _histograms.items()}
+        counters = dict(_counters)
+
+    name = f"{PREFIX}stage_seconds"
+    lines += [f"# HELP {name} Time spent in each pipeline stage.", f"# TYPE {name} histogram"]
+    for stage, (count, total, buckets) in sorted(histograms.items()):
+        stage = _escape(stage)
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, buckets):
+            cumulative += bucket
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+    previous = None
+    for (counter, labels), value in sorted(counters.items()):
+        name = f"{PREFIX}{counter}_total"
+        if counter != previous:
+            lines.append(f"# TYPE {name} counter")
+            previous = counter
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        lines.append(f"{name}{{{label_text}}} {value}" if labels else f"{name} {value}")
+
+    for gauge, (label, value) in sorted(_read_gauges().items()):
+        name = f"{PREFIX}{gauge}"
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, dict):
+            for key, number in sorted(value.items()):
+                lines.append(f'{name}{{{label or "label"}="{_escape(key)}"}} {number}')
+        else:
+            lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port):
+    """Serve to_prometheus() at http://0.0.0.0:port/metrics on a daemon thread (once per process)"""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
@@ -0,0 +1,82 @@
+"""Combine concurrent requests into batched calls.
+
+Callers submit() single items from any thread and get a Future back. A worker
+thread collects whatever arrives within max_wait seconds of the first pending
+item (up to max_batch items) and hands them to process_batch in one call, so a
+model that is much cheaper per item in batches (GPT-2 generation) serves
+several claims for the price of roughly one.
+
+With max_pending set, submit() raises BatcherFull instead of queueing once
+that many items are waiting, so an overloaded model sheds work right away
+rather than letting every caller wait out its timeout. Callers that give up
+should cancel() their future; cancelled items are skipped.
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatcherFull(RuntimeError):
+    pass
+
+
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch=8, max_wait=0.02, name="micro-batcher", max_pending=None):
+        """process_batch takes a list of items and returns a list of results in the same order"""
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.name = name
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, item):
+        """Queue item; the returned Future resolves to its result (or exception)"""
+        future = Future()
+        with self._condition:
+            if self.max_pending is not None and len(self._pending) >= self.max_pending:
+                self._drop_cancelled()
+                if len(self._pending) >= self.max_pending:
+                    raise BatcherFull(f"{self.name} has {len(self._pending)} items waiting")
+            self._pending.append((item, future))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def pending(self):
+        with self._condition:
+            return len(self._pending)
+
+    def _drop_cancelled(self):
+        self._pending = deque(entry for entry in self._pending if not entry[1].cancelled())
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            # Give concurrent callers a moment to join the batch
+            self._condition.wait_for(lambda: len(self._pending) >= self.max_batch, timeout=self.max_wait)
+            count = min(len(self._pending), self.max_batch)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            # Callers that gave up and cancelled are dropped from the batch
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
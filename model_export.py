@@ -0,0 +1,98 @@
+"""Export the vision classifier as a frozen TorchScript graph, and load it back.
+
+The exported graph includes softmax and top-k (see TopKClassifier), is frozen
+and optimized for inference, and records the backend configuration it was
+built from. Point VISION_EXPORTED_MODEL at the file and vision_module loads it
+instead of building the eager model. Either way the model is warmed up with
+the batch sizes in VISION_WARMUP_BATCHES before it serves the first claim, so
+the first request doesn't pay for graph optimization and allocator growth.
+
+    python model_export.py -o artifacts/vision-resnet50.pt
+
+TorchScript is used rather than ONNX so no extra runtime dependency is needed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import torch
+
+from vision_backend import BackendConfig, TopKClassifier, build_model, prepare_batch
+
+CONFIG_FILE = "backend_config.json"
+
+
+def mask_checksum(relevance_mask):
+    if relevance_mask is None:
+        return None
+    return hashlib.sha256(relevance_mask.float().contiguous().numpy().tobytes()).hexdigest()
+
+
+def export(config, output_path, k=5, transform=None, relevance_mask=None):
+    """Trace, freeze and save the classifier for config; returns output_path"""
+    model = TopKClassifier(build_model(config, transform=transform), k, relevance_mask).eval()
+    example = prepare_batch(torch.randn(1, 3, 224, 224), config)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    metadata = {"name": config.name, "backbone": config.backbone, "quantization": config.quantization,
+                "channels_last": config.channels_last, "k": k,
+                "relevance_mask": mask_checksum(relevance_mask)}
+    torch.jit.save(frozen, output_path, _extra_files={CONFIG_FILE: json.dumps(metadata)})
+    return output_path
+
+
+def load(path, config, k=5, relevance_mask=None):
+    """Load an exported classifier, checking it was built for config, k and relevance_mask"""
+    extra_files = {CONFIG_FILE: ""}
+    model = torch.jit.load(path, map_location="cpu", _extra_files=extra_files)
+    metadata = json.loads(extra_files[CONFIG_FILE] or "{}")
+    if metadata.get("name") != config.name:
+        raise ValueError(
+            f"Exported model {path} was built for '{metadata.get('name')}' but the "
+            f"configured backend is '{config.name}'. Re-export or change VISION_* settings."
+        )
+    if metadata.get("k") != k:
+        raise ValueError(f"Exported model {path} returns top-{metadata.get('k')}, expected top-{k}")
+    if metadata.get("relevance_mask") != mask_checksum(relevance_mask):
+        raise ValueError(f"Exported model {path} was built with different labels or insurance keywords. Re-export it.")
+    model.eval()
+    return model
+
+
+def warmup_batch_sizes():
+    value = os.environ.get("VISION_WARMUP_BATCHES", "1,4")
+    return [int(size) for size in value.split(",") if size.strip()]
+
+
+def warm_up(model, config, batch_sizes=None):
+    """Run a few dummy batches so the first real request runs at steady-state speed"""
+    with torch.no_grad():
+        for batch_size in batch_sizes or warmup_batch_sizes():
+            batch = prepare_batch(torch.zeros(batch_size, 3, 224, 224), config)
+            # Two passes: the first optimizes the graph, the second runs the optimized one
+            model(batch)
+            model(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the vision classifier as TorchScript.")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.pt)")
+    parser.add_argument("-k", type=int, default=5, help="Number of top predictions returned (default: 5)")
+    args = parser.parse_args(argv)
+
+    from vision_module import preprocess, get_relevance_mask
+
+    config = BackendConfig.from_env()
+    export(config, args.output, k=args.k, transform=preprocess, relevance_mask=get_relevance_mask())
+    print(f"✅ Exported {config.name} to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
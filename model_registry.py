@@ -0,0 +1,148 @@
+"""Process-wide registry of lazily loaded models.
+
+Modules register a factory under a name at import time; nothing is loaded
+until the first get(). Loading is guarded by a per-name lock so concurrent
+callers (Streamlit sessions, worker threads) build each model exactly once.
+Streamlit reruns the app script but not imported modules, so every session in
+the process shares the same instances.
+
+Inference goes through serving(), which admits at most MODEL_CONCURRENCY callers
+per model at a time (default 1, i.e. serialized). Together with a fixed torch
+thread pool (TORCH_NUM_THREADS / TORCH_INTEROP_THREADS) this keeps CPU and
+activation memory flat however many claimants are using the app.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.environ.get("MODEL_CONCURRENCY", "1"))
+
+_factories = {}
+_instances = {}
+_load_locks = {}
+_slots = {}
+_load_seconds = {}
+_registry_lock = threading.Lock()
+
+_prewarm_thread = None
+_torch_configured = False
+
+
+def register(name, factory, max_concurrency=None):
+    """Register a zero-argument factory that builds the model called name"""
+    with _registry_lock:
+        _factories[name] = factory
+        _load_locks.setdefault(name, threading.Lock())
+        _slots[name] = threading.BoundedSemaphore(max_concurrency or DEFAULT_CONCURRENCY)
+
+
+def configure_torch():
+    """Apply the torch thread settings once per process, before the first model loads"""
+    global _torch_configured
+    with _registry_lock:
+        if _torch_configured:
+            return
+        _torch_configured = True
+
+    import torch
+
+    num_threads = os.environ.get("TORCH_NUM_THREADS")
+    interop_threads = os.environ.get("TORCH_INTEROP_THREADS")
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(int(interop_threads))
+        except RuntimeError:
+            # Can only be set before torch runs any inter-op parallel work
+            logger.warning("TORCH_INTEROP_THREADS ignored: torch inter-op pool already started")
+
+
+def get(name):
+    """Return the model called name, building it on first use"""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+
+    with _registry_lock:
+        if name not in _factories:
+            raise KeyError(f"No model registered under '{name}'")
+        load_lock = _load_locks[name]
+
+    with load_lock:
+        # Another thread may have finished loading while we waited
+        if name not in _instances:
+            start = time.perf_counter()
+            _instances[name] = _factories[name]()
+            _load_seconds[name] = time.perf_counter() - start
+        return _instances[name]
+
+
+@contextmanager
+def serving(name):
+    """Borrow the model called name for one inference call.
+
+    Blocks while the model's concurrency slots are all in use.
+    """
+    model = get(name)
+    slot = _slots[name]
+    with metrics.span(f"model.{name}.wait"):
+        slot.acquire()
+    try:
+        yield model
+    finally:
+        slot.release()
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def load_times():
+    """Seconds each loaded model took to build, by name"""
+    return dict(_load_seconds)
+
+
+metrics.register_gauge("model_load_seconds", load_times, label="model")
+
+
+def registered():
+    with _registry_lock:
+        return list(_factories)
+
+
+def prewarm(modules=(), names=None, background=True):
+    """Import modules (so they register their models) and load models ahead of first use.
+
+    Loads every registered model unless names is given. With background=True this
+    runs once per process on a daemon thread and returns immediately.
+    """
+    global _prewarm_thread
+
+    def _run():
+        for module in modules:
+            importlib.import_module(module)
+        for name in (names or registered()):
+            try:
+                get(name)
+            except Exception as e:
+                # A failed pre-warm is retried on first real use
+                logger.warning("Model pre-warm failed for %r: %s", name, e)
+
+    if not background:
+        _run()
+        return None
+
+    with _registry_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target=_run, name="model-prewarm", daemon=True)
+            _prewarm_thread.start()
+        return _prewarm_thread
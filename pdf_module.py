@@ -0,0 +1,111 @@
+"""Analysis of PDF evidence (medical bills, discharge summaries, reports).
+
+Pages are rasterized one at a time at a low DPI, only as far as they are
+needed: they are classified in small batches and rasterization stops as soon as
+enough relevant pages have been found, so a 100-page hospital report usually
+costs a handful of pages and never more than one batch of page images in memory.
+"""
+import os
+import threading
+
+from image_decode import resize_shorter_side
+from result_cache import content_hash
+import vision_module
+import metrics
+
+PDF_RENDER_DPI = int(os.environ.get("PDF_RENDER_DPI", "50"))
+PDF_BATCH_SIZE = int(os.environ.get("PDF_BATCH_SIZE", "4"))
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "50"))
+# Stop once this many pages match the insurance type
+PDF_ENOUGH_RELEVANT_PAGES = int(os.environ.get("PDF_ENOUGH_RELEVANT_PAGES", "2"))
+
+# PDFium is not thread-safe; claims are processed on several worker threads
+_pdfium_lock = threading.Lock()
+
+
+def iter_pdf_pages(data, dpi=PDF_RENDER_DPI, max_pages=PDF_MAX_PAGES):
+    """Yield (page number, RGB image) for each page, rendering lazily"""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise RuntimeError("PDF analysis requires pypdfium2 (pip install pypdfium2)")
+
+    # The lock is taken per call rather than across the yields, so other
+    # documents render while this one's pages are classified
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(data)
+        page_count = min(len(pdf), max_pages)
+    try:
+        for page_number in range(page_count):
+            with _pdfium_lock, metrics.span("pdf.render"):
+                page = pdf[page_number]
+                try:
+                    bitmap = page.render(scale=dpi / 72)
+                    image = resize_shorter_side(bitmap.to_pil())
+                    bitmap.close()
+                finally:
+                    page.close()
+            yield page_number + 1, image
+    finally:
+        with _pdfium_lock:
+            pdf.close()
+
+
+def _batches(pages, batch_size):
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def analyze_pdf(uploaded_file, insurance_type):
+    """Analyze a PDF document; returns (result, debug_info) like analyze_image"""
+    try:
+        data = vision_module.read_upload_bytes(uploaded_file)
+        document_key = content_hash(data, namespace=f"{vision_module.MODEL_NAME}-v{vision_module.CACHE_VERSION}-pdf{PDF_RENDER_DPI}")
+        cache = vision_module.prediction_cache
+
+        debug_info = []
+        best = None
+        relevant_pages = 0
+
+        for batch in _batches(iter_pdf_pages(data), PDF_BATCH_SIZE):
+            keys = [f"{document_key}-p{page_number}" for page_number, _ in batch]
+            predictions = [cache.get(key) for key in keys]
+            misses = [j for j, prediction in enumerate(predictions) if prediction is None]
+            if misses:
+                for j, prediction in zip(misses, vision_module.classify_images([batch[j][1] for j in misses])):
+                    predictions[j] = prediction
+                    cache.put(keys[j], prediction)
+
+            for (page_number, _), prediction in zip(batch, predictions):
+                is_relevant, confidence, label = vision_module.find_relevant_label(prediction, insurance_type)
+                debug_info.append(
+                    f"Page {page_number}: {label or 'no relevant content'}"
+                    + (f" ({confidence:.1%})" if is_relevant else "")
+                )
+                if is_relevant:
+                    relevant_pages += 1
+                    if best is None or confidence > best[0]:
+                        best = (confidence, prediction)
+
+            metrics.increment("pdf_pages", len(batch))
+            if relevant_pages >= PDF_ENOUGH_RELEVANT_PAGES:
+                debug_info.append(f"Stopped after {len(debug_info)} pages: enough relevant pages found")
+                break
+
+        if not debug_info:
+            return "⚠️ PDF has no pages to analyze.", debug_info
+
+        if best is None:
+            return "⚠️ Document doesn't match the insurance type. Please upload a relevant document.", debug_info
+
+        result, prediction_info = vision_module.build_result(best[1], insurance_type)
+        return result, debug_info + prediction_info
+
+    except Exception as e:
+        return f"⚠️ Error processing PDF: {str(e)}", []
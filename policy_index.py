@@ -0,0 +1,48 @@
+class PolicyIndex:
+    """In-memory hash index over the policy table.
+
+    Builds two dictionaries once so lookups never scan the DataFrame:
+    policy number -> policy holder, and (policy number, insurance type) -> policy holder.
+    Insurance types are stored lowercased so callers can match case-insensitively.
+    """
+
+    def __init__(self, policies):
+        # Keep the first row for each key, same as POLICIES[...].iloc[0]
+        policies = policies.dropna(subset=['policy_number'])
+        numbers = policies['policy_number'].astype('int64').tolist()
+        holders = policies['policy_holder'].tolist()
+        types = policies['insurance_type'].astype(str).str.lower().tolist()
+
+        self._by_number = {}
+        self._by_number_type = {}
+        for number, holder, insurance_type in zip(numbers, holders, types):
+            self._by_number.setdefault(number, holder)
+            self._by_number_type.setdefault((number, insurance_type), holder)
+
+    def __len__(self):
+        return len(self._by_number)
+
+    def __contains__(self, policy_number):
+        return policy_number in self._by_number
+
+    def get_holder(self, policy_number):
+        """Policy holder for a policy number, or None if unknown"""
+        return self._by_number.get(policy_number)
+
+    def matches(self, policy_number, insurance_type):
+        """True if the policy exists with the given insurance type"""
+        return (policy_number, insurance_type.lower()) in self._by_number_type
+
+    def get_holders(self, policy_numbers):
+        """Bulk lookup: list of policy holders (None for unknown numbers)"""
+        get = self._by_number.get
+        return [get(number) for number in policy_numbers]
+
+    def matches_many(self, policy_numbers, insurance_types):
+        """Bulk lookup: list of booleans, one per (policy number, insurance type) pair"""
+        index = self._by_number_type
+        return [
+            (number, str(insurance_type).lower()) in index
+            for number, insurance_type in zip(policy_numbers, insurance_types)
+        ]
+
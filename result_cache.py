@@ -0,0 +1,98 @@
+"""Content-addressed cache for model predictions.
+
+Entries are keyed by a hash of the uploaded bytes, so the same photo uploaded
+again (a retry, or an adjuster reopening a claim) is served from memory instead
+of being decoded and run through the model. The in-memory tier is a bounded LRU;
+the optional disk tier stores one JSON file per entry and survives restarts.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def content_hash(data, namespace=""):
+    """sha256 of the bytes, prefixed by namespace (e.g. the model name) so entries
+    from different models never collide"""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{namespace}-{digest}" if namespace else digest
+
+
+class ResultCache:
+    def __init__(self, max_entries=1024, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[-2:], f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Cache a JSON-serializable value"""
+        with self._lock:
+            self._store(key, value)
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except OSError:
+                # The disk tier is best effort; the memory tier still has the entry
+                pass
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,302 @@
+"""Declarative claim-description rules, reloaded from a JSON file while running.
+
+The rules file (claim_rules.json) holds one ordered rule set per insurance
+type. Each rule has keywords, a match mode ("any": some keyword occurs,
+"none": no keyword occurs), and the status and message it decides. Rules are
+evaluated in order and the first one that matches decides. When none
+matches, "default" applies; types without a rule set get "unknown_type".
+Rules used by several types are defined once under "shared_rules" and listed
+by name. Messages may use {insurance_type}.
+
+Each rule set is compiled into one KeywordMatcher, so a description is
+scanned once however many rules there are. The file's mtime is checked at most
+every reload_interval seconds. A changed file is compiled off to the side and
+swapped in with a single assignment, so evaluations never see a half-loaded
+rule set. A broken file is reported and the previous rules stay in force.
+
+Per-rule counters (matched / decided) and per-rule-set evaluation times are
+kept so slow or dead rules can be found under real traffic.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+MATCH_MODES = ("any", "none")
+
+
+class RuleConfigError(ValueError):
+    pass
+
+
+class Rule:
+    __slots__ = ("id", "match", "keywords", "status", "message")
+
+    def __init__(self, rule_id, match, keywords, status, message):
+        self.id = rule_id
+        self.match = match
+        self.keywords = keywords
+        self.status = status
+        self.message = message
+
+
+class RuleSet:
+    """The compiled rules of one insurance type"""
+
+    def __init__(self, insurance_type, rules):
+        self.insurance_type = insurance_type
+        self.rules = rules
+        self.matcher = KeywordMatcher({rule.id: rule.keywords for rule in rules})
+
+    def evaluate(self, description):
+        """Return (deciding rule or None, ids of rules whose keywords matched)"""
+        hits = self.matcher.scan(description)
+        for rule in self.rules:
+            if (rule.id in hits) == (rule.match == "any"):
+                return rule, hits
+        return None, hits
+
+
+class CompiledRules:
+    def __init__(self, rule_sets, default, unknown_type, source, mtime):
+        self.rule_sets = rule_sets
+        self.default = default
+        self.unknown_type = unknown_type
+        self.source = source
+        self.mtime = mtime
+        self.loaded_at = time.time()
+
+
+def _check_message(message, where):
+    """Messages are formatted on every evaluation, so a bad placeholder is caught here"""
+    if not isinstance(message, str):
+        raise RuleConfigError(f"{where}: message must be a string")
+    try:
+        message.format(insurance_type="x")
+    except (KeyError, IndexError, ValueError) as e:
+        raise RuleConfigError(f"{where}: message can only use {{insurance_type}} ({e!r})")
+
+
+def _outcome(config, name, statuses):
+    outcome = config.get(name)
+    if not isinstance(outcome, dict) or "status" not in outcome or "message" not in outcome:
+        raise RuleConfigError(f"'{name}' must have a status and a message")
+    if statuses and outcome["status"] not in statuses:
+        raise RuleConfigError(f"'{name}' has unknown status '{outcome['status']}'")
+    _check_message(outcome["message"], f"'{name}'")
+    return outcome["status"], outcome["message"]
+
+
+def _rule(spec, rule_id, insurance_type, statuses):
+    where = f"rule '{rule_id}' of {insurance_type}"
+    if not isinstance(spec, dict):
+        raise RuleConfigError(f"{where} must be an object")
+    match = spec.get("match", "any")
+    if match not in MATCH_MODES:
+        raise RuleConfigError(f"{where}: match must be one of {', '.join(MATCH_MODES)}")
+    keywords = spec.get("keywords")
+    if not isinstance(keywords, list) or not all(isinstance(k, str) and k for k in keywords):
+        raise RuleConfigError(f"{where}: keywords must be a list of non-empty strings")
+    status, message = spec.get("status"), spec.get("message")
+    if status is None or message is None:
+        raise RuleConfigError(f"{where}: needs a status and a message")
+    if statuses and status not in statuses:
+        raise RuleConfigError(f"{where}: unknown status '{status}'")
+    _check_message(message, where)
+    return Rule(rule_id, match, [k.lower() for k in keywords], status, message)
+
+
+def compile_rules(config, statuses=None, source=None, mtime=None):
+    """Validate a rules config (as loaded from JSON) and compile it"""
+    if not isinstance(config, dict):
+        raise RuleConfigError("Rules config must be a JSON object")
+    shared = config.get("shared_rules", {})
+    if not isinstance(shared, dict):
+        raise RuleConfigError("shared_rules must be an object")
+    config_sets = config.get("rule_sets", {})
+    if not isinstance(config_sets, dict):
+        raise RuleConfigError("rule_sets must be an object")
+    rule_sets = {}
+    for insurance_type, specs in config_sets.items():
+        if not isinstance(specs, list):
+            raise RuleConfigError(f"The rules of {insurance_type} must be a list")
+        rules = []
+        for spec in specs:
+            if isinstance(spec, str):
+                if spec not in shared:
+                    raise RuleConfigError(f"{insurance_type} uses unknown shared rule '{spec}'")
+                rule_id, spec = spec, shared[spec]
+            elif not isinstance(spec, dict):
+                raise RuleConfigError(f"A rule of {insurance_type} must be an object or a shared rule name")
+            else:
+                rule_id = spec.get("id")
+                if not rule_id:
+                    raise RuleConfigError(f"A rule of {insurance_type} has no id")
+            if any(rule.id == rule_id for rule in rules):
+                raise RuleConfigError(f"{insurance_type} has two rules called '{rule_id}'")
+            rules.append(_rule(spec, rule_id, insurance_type, statuses))
+        rule_sets[insurance_type] = RuleSet(insurance_type, rules)
+
+    if not rule_sets:
+        raise RuleConfigError("Rules config has no rule_sets")
+    return CompiledRules(
+        rule_sets,
+        _outcome(config, "default", statuses),
+        _outcome(config, "unknown_type", statuses),
+        source,
+        mtime,
+    )
+
+
+class _RuleStats:
+    __slots__ = ("matched", "decided")
+
+    def __init__(self):
+        self.matched = 0
+        self.decided = 0
+
+
+class RuleEngine:
+    def __init__(self, path, statuses=None, reload_interval=2.0):
+        """statuses, if given, restricts the statuses rules may decide"""
+        self.path = path
+        self.statuses = set(statuses) if statuses else None
+        self.reload_interval = reload_interval
+        self.last_error = None
+        self._reload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._next_check = 0.0
+        self._rule_stats = {}
+        self._timings = {}
+        self.reloads = 0
+        self._rules = self._load()
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, encoding="utf-8") as f:
+            config = json.load(f)
+        try:
+            return compile_rules(config, self.statuses, self.path, mtime)
+        except RuleConfigError:
+            raise
+        except Exception as e:
+            # Anything compile_rules didn't anticipate still leaves the previous rules in force
+            raise RuleConfigError(f"Invalid rules config: {e!r}") from e
+
+    def reload(self, force=False):
+        """Swap in the rules file if it changed since it was loaded; returns True if swapped"""
+        # One thread checks at a time; the others keep evaluating the current rules
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                if not force and os.stat(self.path).st_mtime_ns == self._rules.mtime:
+                    return False
+                rules = self._load()
+            except (OSError, ValueError) as e:
+                if str(e) != self.last_error:
+                    logger.warning("Claim rules not reloaded from %s: %s", self.path, e)
+                self.last_error = str(e)
+                return False
+            self._rules = rules
+            self.last_error = None
+            self.reloads += 1
+            return True
+        finally:
+            self._reload_lock.release()
+
+    @property
+    def rules(self):
+        """The rules currently in force (checks the file for changes at most every reload_interval)"""
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        return self._rules
+
+    def evaluate(self, insurance_type, description):
+        """Apply the insurance type's rules to a description; returns (status, message)"""
+        rules = self.rules
+        rule_set = rules.rule_sets.get(insurance_type)
+        if rule_set is None:
+            status, message = rules.unknown_type
+            return status, message.format(insurance_type=insurance_type)
+
+        start = time.perf_counter()
+        rule, hits = rule_set.evaluate(description)
+        elapsed = time.perf_counter() - start
+        self._record(insurance_type, rule, hits, elapsed)
+
+        status, message = (rule.status, rule.message) if rule else rules.default
+        return status, message.format(insurance_type=insurance_type)
+
+    def scan(self, insurance_type, text):
+        """Ids of the insurance type's rules whose keywords occur in text"""
+        rule_set = self.rules.rule_sets.get(insurance_type)
+        return rule_set.matcher.scan(text) if rule_set else set()
+
+    def rule_sets(self):
+        return dict(self.rules.rule_sets)
+
+    def _record(self, insurance_type, rule, hits, elapsed):
+        with self._stats_lock:
+            for rule_id in hits:
+                self._rule_stat(insurance_type, rule_id).matched += 1
+            if rule is not None:
+                self._rule_stat(insurance_type, rule.id).decided += 1
+            timing = self._timings.get(insurance_type)
+            if timing is None:
+                timing = self._timings[insurance_type] = [0, 0.0, 0.0]
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    def _rule_stat(self, insurance_type, rule_id):
+        key = (insurance_type, rule_id)
+        stat = self._rule_stats.get(key)
+        if stat is None:
+            stat = self._rule_stats[key] = _RuleStats()
+        return stat
+
+    def stats(self):
+        """Per-rule counters and per-rule-set evaluation times for the rules in force"""
+        rules = self._rules
+        with self._stats_lock:
+            rule_rows = []
+            for insurance_type, rule_set in rules.rule_sets.items():
+                for position, rule in enumerate(rule_set.rules):
+                    stat = self._rule_stats.get((insurance_type, rule.id)) or _RuleStats()
+                    rule_rows.append({
+                        "insurance_type": insurance_type,
+                        "rule": rule.id,
+                        "position": position + 1,
+                        "keywords": len(rule.keywords),
+                        "status": rule.status,
+                        "matched": stat.matched,
+                        "decided": stat.decided,
+                    })
+            timings = {
+                insurance_type: {
+                    "evaluations": count,
+                    "mean_us": total / count * 1e6 if count else 0.0,
+                    "max_us": longest * 1e6,
+                }
+                for insurance_type, (count, total, longest) in self._timings.items()
+            }
+        return {
+            "source": rules.source,
+            "loaded_at": rules.loaded_at,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "rules": rule_rows,
+            "timings": timings,
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._rule_stats.clear()
+            self._timings.clear()
@@ -0,0 +1,319 @@
+"""Synthetic policies, claims and images for scale and load testing.
+
+poilicies.csv only has a few dozen rows, so scaling problems can't be
+reproduced with it. This generates, reproducibly from a seed and in chunks so
+memory stays flat at any size:
+
+- policy tables of millions of rows in the poilicies.csv schema
+- claim streams against such a table, with descriptions built from the real
+  rule vocabularies in claim_rules.json and an expected_status column (a
+  ClaimStatus value, directly comparable with batch_validation's status_code)
+- sets of synthetic photos
+
+Policies are a pure function of (rows, seed): the i-th policy can be computed
+without generating the others, so claims can reference valid (and guaranteed
+invalid) policy numbers of a 10^8-row table without loading it.
+
+    python synth_data.py policies -n 10000000 -o policies_10m.csv
+    python synth_data.py claims -n 1000000 --policy-rows 10000000 -o claims.csv
+    POLICIES_CSV=policies_10m.csv python batch_validation.py claims.csv -o results.csv
+    python synth_data.py images -n 200 --size 1920x1080 -o synthetic_images/
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+
+INSURANCE_TYPES = ["Auto", "Home", "Health"]
+FIRST_NAMES = ["Vaishnavi", "John", "Alex", "Priya", "Maria", "Chen", "Aisha", "Rahul", "Sofia", "David",
+               "Fatima", "Arjun", "Emma", "Kenji", "Lucas", "Ananya"]
+LAST_NAMES = ["Doe", "Kumar", "Shah", "Garcia", "Wei", "Khan", "Patel", "Rossi", "Smith", "Iyer",
+              "Tanaka", "Silva", "Reddy", "Nair", "Brown", "Mehta"]
+FILLER = (
+    "the incident happened late in the evening near the main road and was reported to the "
+    "local authorities shortly after with photos taken at the scene by my neighbour who "
+    "called for help while we waited outside for hours"
+).split()
+
+# Policy numbers start here; a table of n rows uses numbers from [START, START + 10n)
+POLICY_NUMBER_START = 100000
+POLICY_NUMBER_SPREAD = 10
+
+# Claim scenarios and the validation outcome each one is built to produce
+# Scenario -> the ClaimStatus value the validators return for it (status_code)
+SCENARIOS = {
+    "approved": "approved",
+    "pending_review": "pending_review",
+    "minor_issue": "rejected",
+    "maintenance": "rejected",
+    "fraud": "fraud",
+    "no_event": "rejected",
+    "unknown_policy": "rejected",
+    "wrong_type": "rejected",
+}
+DEFAULT_MIX = {
+    "approved": 0.35, "pending_review": 0.2, "minor_issue": 0.1, "maintenance": 0.05,
+    "fraud": 0.05, "no_event": 0.1, "unknown_policy": 0.1, "wrong_type": 0.05,
+}
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _mix64(values, seed):
+    """splitmix64 of values + seed: a fast, well-spread hash for deterministic per-row choices"""
+    with np.errstate(over="ignore"):
+        z = values.astype(np.uint64) + np.uint64(seed & 0xFFFFFFFF) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return (z ^ (z >> np.uint64(31))) & _MASK64
+
+
+class PolicyTable:
+    """The synthetic policy table of `rows` rows for `seed`, computed row by row.
+
+    Policy numbers are an affine permutation of [0, 10 * rows), so they are
+    unique and look random; the numbers the permutation gives to positions
+    rows..10*rows are guaranteed not to be in the table.
+    """
+
+    def __init__(self, rows, seed=0):
+        self.rows = rows
+        self.seed = seed
+        self.number_range = max(rows * POLICY_NUMBER_SPREAD, 1)
+        rng = np.random.default_rng(seed)
+        multiplier = int(rng.integers(self.number_range // 3 + 1, self.number_range + 1))
+        while math.gcd(multiplier, self.number_range) != 1:
+            multiplier += 1
+        self._multiplier = multiplier
+        self._offset = int(rng.integers(0, self.number_range))
+
+    def policy_numbers(self, positions):
+        positions = np.asarray(positions, dtype=np.int64)
+        return POLICY_NUMBER_START + (positions * self._multiplier + self._offset) % self.number_range
+
+    def insurance_types(self, positions):
+        codes = _mix64(np.asarray(positions), self.seed) % np.uint64(len(INSURANCE_TYPES))
+        return np.array(INSURANCE_TYPES, dtype=object)[codes.astype(np.int64)]
+
+    def holders(self, positions):
+        h = _mix64(np.asarray(positions), self.seed + 1)
+        first = np.array(FIRST_NAMES, dtype=object)[(h % np.uint64(len(FIRST_NAMES))).astype(np.int64)]
+        last = np.array(LAST_NAMES, dtype=object)[((h >> np.uint64(16)) % np.uint64(len(LAST_NAMES))).astype(np.int64)]
+        return first + " " + last
+
+    def rows_between(self, start, stop):
+        """Rows start..stop as a DataFrame in the poilicies.csv schema"""
+        positions = np.arange(start, min(stop, self.rows), dtype=np.int64)
+        return pd.DataFrame({
+            "policy_number": self.policy_numbers(positions),
+            "policy_holder": self.holders(positions),
+            "insurance_type": self.insurance_types(positions),
+        })
+
+    def chunks(self, chunksize=1_000_000):
+        for start in range(0, self.rows, chunksize):
+            yield self.rows_between(start, start + chunksize)
+
+    def unknown_policy_numbers(self, count, rng):
+        """Policy numbers guaranteed not to be in the table"""
+        return self.policy_numbers(rng.integers(self.rows, self.number_range, size=count))
+
+
+class DescriptionVocabulary:
+    """Keywords of the rule sets in claim_rules.json (rules valid_event, minor_issue,
+    maintenance, fraud and severity), filtered so each scenario's description
+    triggers exactly the rules it is meant to (e.g. "mold" also contains the
+    maintenance keyword "old", so it is never used as a plain home event)"""
+
+    def __init__(self, rules_path=None):
+        # Read from the rules file directly: importing claim_validation would load
+        # and index the whole POLICIES_CSV table just for the keywords
+        from rule_engine import RuleEngine
+
+        rules_path = rules_path or os.environ.get("CLAIM_RULES_PATH") or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "claim_rules.json")
+        self.events, self.minor_issues, self.maintenance, self.fraud, self.severity = {}, {}, {}, {}, {}
+        rule_sets = RuleEngine(rules_path).rule_sets()
+        for insurance_type, rule_set in rule_sets.items():
+            keywords = {rule.id: rule.keywords for rule in rule_set.rules}
+
+            def clean(rule_id, allowed):
+                # Keywords that, on their own, only trigger the allowed rules
+                return [k for k in keywords.get(rule_id, []) if rule_set.matcher.scan(k) <= allowed]
+
+            self.events[insurance_type] = clean("valid_event", {"valid_event"})
+            self.minor_issues[insurance_type] = clean("minor_issue", {"valid_event", "minor_issue"})
+            self.maintenance[insurance_type] = clean("maintenance", {"maintenance"})
+            self.fraud[insurance_type] = clean("fraud", {"fraud"})
+            self.severity[insurance_type] = clean("severity", {"severity"})
+        self.filler = [
+            word for word in FILLER
+            if not any(rule_set.matcher.scan(word) for rule_set in rule_sets.values())
+        ]
+
+    def describe(self, scenario, insurance_type, words, rng):
+        """A description of about `words` words for the scenario"""
+        keywords = []
+        if scenario not in ("no_event",):
+            keywords.append(rng.choice(self.events[insurance_type]))
+        if scenario == "approved":
+            keywords.append(rng.choice(self.severity[insurance_type]))
+        elif scenario == "minor_issue":
+            keywords.append(rng.choice(self.minor_issues[insurance_type]))
+        elif scenario == "maintenance":
+            keywords.append(rng.choice(self.maintenance[insurance_type]))
+        elif scenario == "fraud":
+            keywords.append(rng.choice(self.fraud[insurance_type]))
+
+        text = [rng.choice(self.filler) for _ in range(max(words - len(keywords), 0))]
+        for keyword in keywords:
+            text.insert(rng.randrange(len(text) + 1), keyword)
+        return " ".join(text)
+
+
+def generate_claims(table, count, words=30, mix=None, seed=0, chunksize=100_000):
+    """Yield DataFrame chunks of claims against table.
+
+    Columns: insurance_type, policy_number, description (what the validators
+    read) plus scenario and expected_status, which batch_validation results
+    carry through next to the status_code it should equal.
+    """
+    mix = mix or DEFAULT_MIX
+    names = list(mix)
+    weights = np.array([mix[name] for name in names], dtype=float)
+    weights /= weights.sum()
+
+    vocabulary = DescriptionVocabulary()
+    rng = np.random.default_rng([seed, 1])
+    text_rng = random.Random(seed)
+
+    for start in range(0, count, chunksize):
+        size = min(chunksize, count - start)
+        scenarios = np.array(names, dtype=object)[rng.choice(len(names), size=size, p=weights)]
+        positions = rng.integers(0, table.rows, size=size)
+        numbers = table.policy_numbers(positions)
+        types = table.insurance_types(positions)
+
+        unknown = scenarios == "unknown_policy"
+        numbers[unknown] = table.unknown_policy_numbers(int(unknown.sum()), rng)
+        wrong = scenarios == "wrong_type"
+        # Shift to one of the other two types
+        shift = rng.integers(1, len(INSURANCE_TYPES), size=int(wrong.sum()))
+        type_codes = np.array([INSURANCE_TYPES.index(t) for t in types[wrong]], dtype=np.int64)
+        types[wrong] = np.array(INSURANCE_TYPES, dtype=object)[(type_codes + shift) % len(INSURANCE_TYPES)]
+
+        descriptions = [
+            vocabulary.describe(scenario, insurance_type, words, text_rng)
+            for scenario, insurance_type in zip(scenarios, types)
+        ]
+        yield pd.DataFrame({
+            "insurance_type": types,
+            "policy_number": numbers,
+            "description": descriptions,
+            "scenario": scenarios,
+            "expected_status": [SCENARIOS[scenario] for scenario in scenarios],
+        })
+
+
+def synthetic_image(width, height, rng):
+    """An RGB PIL image of smooth random content (compresses like a photo, not like noise)"""
+    from PIL import Image
+
+    small = rng.integers(0, 255, size=(max(height // 32, 1), max(width // 32, 1), 3), dtype=np.uint8)
+    return Image.fromarray(small).resize((width, height), Image.BILINEAR)
+
+
+def write_images(output_dir, count, width=1920, height=1080, seed=0, fmt="jpg", quality=85):
+    """Write count synthetic photos to output_dir; returns their paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng([seed, 2])
+    paths = []
+    for i in range(count):
+        path = os.path.join(output_dir, f"synthetic_{width}x{height}_{i:06d}.{fmt}")
+        image = synthetic_image(width, height, rng)
+        if fmt == "jpg":
+            image.save(path, format="JPEG", quality=quality)
+        else:
+            image.save(path)
+        paths.append(path)
+    return paths
+
+
+def _write_chunks(chunks, output_path, label):
+    from batch_validation import ResultWriter
+
+    with ResultWriter(output_path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+            print(f"\rWrote {writer.rows:,} {label}", end="", file=sys.stderr, flush=True)
+    print(f"\rWrote {writer.rows:,} {label} -> {output_path}", file=sys.stderr)
+    return writer.rows
+
+
+def _parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def _parse_size(value):
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic policies, claims and images.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    policies = commands.add_parser("policies", help="Policy table in the poilicies.csv schema")
+    policies.add_argument("-n", "--rows", type=int, required=True)
+    policies.add_argument("-o", "--output", required=True, help="Output file (.csv or .jsonl)")
+    policies.add_argument("--seed", type=int, default=0)
+    policies.add_argument("-c", "--chunksize", type=int, default=1_000_000)
+
+    claims = commands.add_parser("claims", help="Claims against a generated policy table")
+    claims.add_argument("-n", "--count", type=int, required=True)
+    claims.add_argument("-o", "--output", required=True, help="Output file (.csv or .jsonl)")
+    claims.add_argument("--policy-rows", type=int, required=True, help="Rows of the policy table (as passed to 'policies -n')")
+    claims.add_argument("--policy-seed", type=int, default=0, help="Seed of the policy table (default: 0)")
+    claims.add_argument("--seed", type=int, default=0)
+    claims.add_argument("--words", type=int, default=30, help="Approximate words per description (default: 30)")
+    claims.add_argument("--mix", type=_parse_mix, default=None,
+                        help="Scenario weights, e.g. approved=0.5,fraud=0.5 (default: a realistic mix)")
+    claims.add_argument("-c", "--chunksize", type=int, default=100_000)
+
+    images = commands.add_parser("images", help="Synthetic photos")
+    images.add_argument("-n", "--count", type=int, required=True)
+    images.add_argument("-o", "--output", required=True, help="Output directory")
+    images.add_argument("--size", type=_parse_size, default=(1920, 1080), help="WIDTHxHEIGHT (default: 1920x1080)")
+    images.add_argument("--format", choices=["jpg", "png"], default="jpg")
+    images.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "policies":
+            _write_chunks(PolicyTable(args.rows, args.seed).chunks(args.chunksize), args.output, "policies")
+        elif args.command == "claims":
+            table = PolicyTable(args.policy_rows, args.policy_seed)
+            _write_chunks(generate_claims(table, args.count, args.words, args.mix, args.seed, args.chunksize),
+                          args.output, "claims")
+        else:
+            width, height = args.size
+            paths = write_images(args.output, args.count, width, height, args.seed, args.format)
+            print(f"Wrote {len(paths)} images -> {args.output}", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Configurable CPU inference backend for the image classifier.
+
+Chooses the backbone and how it is optimized for CPU-only nodes:
+
+    VISION_BACKBONE      resnet50 (default) | resnet18 | mobilenet
+    VISION_QUANTIZATION  none (default) | dynamic | static
+    VISION_CHANNELS_LAST 1 to run convolutions in channels-last memory layout
+
+Dynamic quantization converts only the final Linear layer to int8, so for these
+convolutional backbones it saves little. Static quantization fuses conv/bn/relu
+and converts the whole network to int8, calibrated on the images in
+VISION_CALIBRATION_DIR (random inputs are used if it is not set, which costs
+accuracy). Use benchmarks/quantization.py to measure the latency and top-5
+agreement of a configuration against the FP32 baseline before enabling it.
+"""
+import glob
+import logging
+import os
+import platform
+from dataclasses import dataclass
+
+import torch
+import torchvision.models as models
+import torchvision.models.quantization as quantizable_models
+
+import artifacts
+
+logger = logging.getLogger(__name__)
+
+BACKBONES = {
+    # name: (artifact name, float builder, quantizable builder)
+    "resnet50": ("resnet50", models.resnet50, quantizable_models.resnet50),
+    "resnet18": ("resnet18", models.resnet18, quantizable_models.resnet18),
+    "mobilenet": ("mobilenet_v3_large", models.mobilenet_v3_large, quantizable_models.mobilenet_v3_large),
+}
+
+QUANTIZATION_MODES = ("none", "dynamic", "static")
+CALIBRATION_BATCHES = 8
+
+
+@dataclass(frozen=True)
+class BackendConfig:
+    backbone: str = "resnet50"
+    quantization: str = "none"
+    channels_last: bool = False
+
+    def __post_init__(self):
+        if self.backbone not in BACKBONES:
+            raise ValueError(f"Unknown backbone '{self.backbone}'. Choose from: {', '.join(BACKBONES)}")
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{self.quantization}'. Choose from: {', '.join(QUANTIZATION_MODES)}")
+
+    @property
+    def name(self):
+        """Identifies the model variant (used as registry and cache key)"""
+        name = self.backbone
+        if self.quantization != "none":
+            name += f"-{self.quantization}-int8"
+        if self.channels_last:
+            name += "-cl"
+        return name
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            backbone=os.environ.get("VISION_BACKBONE", "resnet50").lower(),
+            quantization=os.environ.get("VISION_QUANTIZATION", "none").lower(),
+            channels_last=os.environ.get("VISION_CHANNELS_LAST", "").lower() in ("1", "true", "yes"),
+        )
+
+
+def _set_quantized_engine():
+    # fbgemm/x86 on Intel/AMD, qnnpack on ARM
+    supported = torch.backends.quantized.supported_engines
+    preferred = ["qnnpack"] if platform.machine().lower() in ("arm64", "aarch64") else ["x86", "fbgemm"]
+    for engine in preferred + ["qnnpack", "fbgemm"]:
+        if engine in supported:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError("No quantized engine available in this torch build")
+
+
+def _calibration_batches(transform, batch_size=8):
+    """Batches of preprocessed calibration images, or random inputs as a fallback"""
+    from PIL import Image
+
+    calibration_dir = os.environ.get("VISION_CALIBRATION_DIR")
+    paths = []
+    if calibration_dir:
+        for pattern in ("*.jpg", "*.jpeg", "*.png"):
+            paths.extend(glob.glob(os.path.join(calibration_dir, pattern)))
+    paths = sorted(paths)[:batch_size * CALIBRATION_BATCHES]
+
+    if not paths:
+        logger.warning("VISION_CALIBRATION_DIR not set or empty: calibrating static quantization on random inputs")
+        for _ in range(CALIBRATION_BATCHES):
+            yield torch.randn(batch_size, 3, 224, 224)
+        return
+
+    for start in range(0, len(paths), batch_size):
+        images = [transform(Image.open(path).convert("RGB")) for path in paths[start:start + batch_size]]
+        yield torch.stack(images)
+
+
+def build_model(config, transform=None):
+    """Build the classifier described by config, loading weights from the artifact cache"""
+    artifact_name, float_builder, quantizable_builder = BACKBONES[config.backbone]
+    state_dict = artifacts.load_state_dict(artifact_name)
+
+    if config.quantization == "static":
+        _set_quantized_engine()
+        model = quantizable_builder(weights=None, quantize=False)
+        model.load_state_dict(state_dict)
+        model.eval()
+        model.fuse_model()
+        model.qconfig = torch.ao.quantization.get_default_qconfig(torch.backends.quantized.engine)
+        torch.ao.quantization.prepare(model, inplace=True)
+        with torch.no_grad():
+            for batch in _calibration_batches(transform):
+                model(batch)
+        torch.ao.quantization.convert(model, inplace=True)
+    else:
+        model = float_builder(weights=None)
+        model.load_state_dict(state_dict)
+        model.eval()
+        if config.quantization == "dynamic":
+            _set_quantized_engine()
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if config.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+class TopKClassifier(torch.nn.Module):
+    """Wraps a classifier so it returns (top-k probabilities, top-k class indices).
+
+    Keeping softmax and top-k inside the module means the exported graph does
+    the whole computation and only k values per image leave the model.
+
+    Given a (num_classes, num_groups) 0/1 relevance_mask, it also returns, per
+    image and group: the total probability of the group's classes, and the
+    probability and index of the group's most likely class. These are computed
+    over the full probability vector, not just the top k.
+    """
+
+    def __init__(self, model, k=5, relevance_mask=None):
+        super().__init__()
+        self.model = model
+        self.k = k
+        self.has_mask = relevance_mask is not None
+        if self.has_mask:
+            self.register_buffer("relevance_mask", relevance_mask.float())
+
+    def forward(self, x):
+        probabilities = torch.nn.functional.softmax(self.model(x), dim=1)
+        top_prob, top_idx = torch.topk(probabilities, self.k, dim=1)
+        if not self.has_mask:
+            return top_prob, top_idx
+        group_mass = probabilities @ self.relevance_mask
+        group_best_prob, group_best_idx = (probabilities.unsqueeze(2) * self.relevance_mask).max(dim=1)
+        return top_prob, top_idx, group_mass, group_best_prob, group_best_idx
+
+
+def prepare_batch(batch, config):
+    """Put an input batch in the memory layout the model expects"""
+    if config.channels_last:
+        return batch.contiguous(memory_format=torch.channels_last)
+    return batch
@@ -1,17 +1,76 @@
-from PIL import Image
 import torch
 import torchvision.transforms as transforms
-from torchvision.models import resnet50
-import requests
 import numpy as np
+import os
+import model_registry
+import artifacts
+from result_cache import ResultCache, content_hash
+from image_decode import decode_image, fill_batch
+from image_hash_index import dhash, get_image_index
+from vision_backend import BackendConfig, TopKClassifier, build_model, prepare_batch
+import model_export
+import metrics
 
-# Load ImageNet labels
-LABELS_URL = "https://raw.githubusercontent.com/pytorch/hub/master/imagenet_classes.txt"
-labels = requests.get(LABELS_URL).text.splitlines()
+# Backbone, quantization and memory layout come from the environment (see vision_backend.py)
+BACKEND_CONFIG = BackendConfig.from_env()
+MODEL_NAME = BACKEND_CONFIG.name
+TOP_K = 5
+# Bumped when the cached prediction format changes
+CACHE_VERSION = 3
+# An image is also relevant when this much probability falls on the type's labels,
+# even if none of them is in the top-k
+RELEVANCE_MASS_THRESHOLD = float(os.environ.get("RELEVANCE_MASS_THRESHOLD", "0.3"))
 
-# Load pretrained model
-model = resnet50(pretrained=True)
-model.eval()
+# ImageNet labels and the pretrained model are loaded on first use,
+# from the local artifact cache (see artifacts.py)
+def _load_labels():
+    return artifacts.load_labels()
+
+def _build_relevance_mask():
+    """(num labels, num insurance types) 0/1 tensor: label matches the type's keywords.
+
+    Computed once, so relevance is a tensor op over all classes instead of a
+    keyword loop over the top-k labels of every image.
+    """
+    labels = [label.lower() for label in get_labels()]
+    mask = torch.zeros(len(labels), len(INSURANCE_TYPES))
+    for t, insurance_type in enumerate(INSURANCE_TYPES):
+        keywords = INSURANCE_CONFIG[insurance_type]["keywords"]
+        for l, label in enumerate(labels):
+            if any(keyword in label for keyword in keywords):
+                mask[l, t] = 1
+    return mask
+
+def _load_model():
+    model_registry.configure_torch()
+    relevance_mask = get_relevance_mask()
+    exported_path = os.environ.get("VISION_EXPORTED_MODEL")
+    if exported_path:
+        # Frozen TorchScript graph from model_export.py
+        model = model_export.load(exported_path, BACKEND_CONFIG, k=TOP_K, relevance_mask=relevance_mask)
+    else:
+        model = TopKClassifier(build_model(BACKEND_CONFIG, transform=preprocess), TOP_K, relevance_mask).eval()
+    model_export.warm_up(model, BACKEND_CONFIG)
+    return model
+
+model_registry.register("imagenet_labels", _load_labels)
+model_registry.register("relevance_mask", _build_relevance_mask)
+model_registry.register(MODEL_NAME, _load_model)
+
+def get_labels():
+    return model_registry.get("imagenet_labels")
+
+def get_relevance_mask():
+    return model_registry.get("relevance_mask")
+
+def get_model():
+    return model_registry.get(MODEL_NAME)
+
+# Top-k predictions keyed by image content hash, so re-uploaded photos skip the model
+prediction_cache = ResultCache(
+    max_entries=int(os.environ.get("IMAGE_CACHE_SIZE", "1024")),
+    disk_dir=os.environ.get("IMAGE_CACHE_DIR") or None,
+)
 
 # Preprocessing pipeline
 preprocess = transforms.Compose([
@@ -67,44 +126,171 @@ INSURANCE_CONFIG = {
     }
 }
 
+INSURANCE_TYPES = list(INSURANCE_CONFIG)
+
+def _cache_lookups():
+    stats = prediction_cache.stats()
+    return {"hit": stats["hits"], "disk_hit": stats["disk_hits"], "miss": stats["misses"]}
+
+metrics.register_gauge("image_cache_hit_rate", lambda: prediction_cache.stats()["hit_rate"])
+metrics.register_gauge("image_cache_lookups", _cache_lookups, label="result")
+
 def analyze_image(uploaded_file, insurance_type):
+    return analyze_images([uploaded_file], insurance_type)[0]
+
+def read_upload_bytes(uploaded_file):
+    if hasattr(uploaded_file, "getvalue"):
+        return uploaded_file.getvalue()
+    if hasattr(uploaded_file, "read"):
+        data = uploaded_file.read()
+        if hasattr(uploaded_file, "seek"):
+            uploaded_file.seek(0)
+        return data
+    with open(uploaded_file, "rb") as f:
+        return f.read()
+
+def analyze_images(uploaded_files, insurance_type, claim_id=None, policy_number=None):
+    """Analyze all images for a claim with a single batched forward pass.
+
+    Returns a list of (result, debug_info) tuples, one per uploaded file, in order.
+    Files that fail to decode get an error result without affecting the others.
+    Images already seen (same bytes) are answered from the prediction cache.
+    With a claim_id, images are also checked against (and added to) the
+    perceptual-hash index of earlier claims' images (see image_hash_index).
+    """
+    results = [None] * len(uploaded_files)
+    predictions = [None] * len(uploaded_files)
+    images = []
+    batch_positions = []
+    batch_keys = []
+    batch_hashes = []
+
+    # Look up each image by content hash; decode and preprocess only the misses
+    for i, uploaded_file in enumerate(uploaded_files):
+        try:
+            data = read_upload_bytes(uploaded_file)
+            key = content_hash(data, namespace=f"{MODEL_NAME}-v{CACHE_VERSION}")
+            predictions[i] = prediction_cache.get(key)
+            if predictions[i] is None:
+                # Reduced-resolution decode keeps memory bounded for large photos
+                with metrics.span("vision.decode"):
+                    image = decode_image(data)
+                image_hash = dhash(image)
+                # Appended together, once every step has succeeded, so the lists stay aligned
+                images.append(image)
+                batch_positions.append(i)
+                batch_keys.append(key)
+                batch_hashes.append(image_hash)
+        except Exception as e:
+            results[i] = (f"⚠️ Error processing image: {str(e)}", [])
+
+    if images:
+        try:
+            # One forward pass for all uncached images of the claim
+            batch_predictions = classify_images(images)
+        except Exception as e:
+            for i in batch_positions:
+                results[i] = (f"⚠️ Error processing image: {str(e)}", [])
+            batch_positions = []
+            batch_predictions = []
+
+        for i, key, image_hash, prediction in zip(batch_positions, batch_keys, batch_hashes, batch_predictions):
+            # The perceptual hash is cached with the prediction so repeat uploads skip decoding
+            prediction["dhash"] = image_hash
+            predictions[i] = prediction
+            prediction_cache.put(key, prediction)
+
+    for i, prediction in enumerate(predictions):
+        if results[i] is None and prediction is not None:
+            results[i] = build_result(prediction, insurance_type)
+
+    if claim_id is not None:
+        flag_reused_images(uploaded_files, predictions, results, claim_id, policy_number)
+
+    return results
+
+def flag_reused_images(uploaded_files, predictions, results, claim_id, policy_number):
+    """Index the claim's image hashes and prepend a warning to the results of
+    images that match an image from another claim"""
+    hashed = [i for i, prediction in enumerate(predictions) if prediction is not None]
+    images = [(getattr(uploaded_files[i], "name", str(uploaded_files[i])), predictions[i]["dhash"]) for i in hashed]
+    for i, matches in zip(hashed, get_image_index().check_and_add(claim_id, policy_number, images)):
+        if not matches:
+            continue
+        feedback, debug_info = results[i]
+        first = matches[0]
+        holder = "the same policyholder" if str(first["policy_number"]) == str(policy_number) else "a different policyholder"
+        warning = f"🔁 Possible reused image: matches evidence from claim {first['claim_id']} ({holder})"
+        details = [
+            f"Image reuse: claim {match['claim_id']}, policy {match['policy_number']}, {match['distance']} of 64 hash bits differ"
+            for match in matches
+        ]
+        results[i] = (f"{warning}\n{feedback}", debug_info + details)
+
+def classify_images(images):
+    """Top-k predictions for decoded RGB images (see image_decode), in one forward pass"""
+    with metrics.span("vision.preprocess"):
+        batch = prepare_batch(fill_batch(images), BACKEND_CONFIG)
+    # The model returns softmax top-k and per-insurance-type relevance directly
+    with model_registry.serving(MODEL_NAME) as model, torch.no_grad(), metrics.span("vision.forward"):
+        top_prob, top_idx, type_mass, best_prob, best_idx = model(batch)
+    metrics.increment("images_classified", len(images))
+    type_mass, best_prob, best_idx = type_mass.tolist(), best_prob.tolist(), best_idx.tolist()
+    return [
+        {
+            "top_prob": top_prob[row].tolist(),
+            "top_idx": top_idx[row].tolist(),
+            "relevance": {
+                insurance_type: {
+                    "mass": type_mass[row][t],
+                    "best_prob": best_prob[row][t],
+                    "best_idx": best_idx[row][t],
+                }
+                for t, insurance_type in enumerate(INSURANCE_TYPES)
+            },
+        }
+        for row in range(len(images))
+    ]
+
+def get_cache_stats():
+    return prediction_cache.stats()
+
+def find_relevant_label(prediction, insurance_type):
+    """Check a prediction's top labels against the insurance type's keywords.
+
+    Returns (is_relevant, confidence, top_label).
+    """
+    relevance = prediction["relevance"].get(insurance_type.lower())
+    # best_prob is 0 when no label at all matches the type's keywords
+    if relevance is None or relevance["best_prob"] <= 0:
+        return False, 0.0, ""
+    
+    # Relevant when the type's most likely label made the top-k (the original rule),
+    # or when enough total probability falls on the type's labels
+    if relevance["best_idx"] in prediction["top_idx"] or relevance["mass"] >= RELEVANCE_MASS_THRESHOLD:
+        return True, relevance["best_prob"], get_labels()[relevance["best_idx"]].lower()
+    return False, 0.0, ""
+
+def build_result(prediction, insurance_type):
     debug_info = []
     try:
-        # Open and preprocess image
-        image = Image.open(uploaded_file).convert("RGB")
-        input_tensor = preprocess(image).unsqueeze(0)
-        
-        # Get model predictions
-        with torch.no_grad():
-            output = model(input_tensor)
-        
-        # Get top predictions
-        probabilities = torch.nn.functional.softmax(output[0], dim=0)
-        top5_prob, top5_idx = torch.topk(probabilities, 5)
+        labels = get_labels()
+        top5_prob = prediction["top_prob"]
+        top5_idx = prediction["top_idx"]
         
         # Store debug information
         for i in range(5):
-            debug_info.append(f"Prediction {i+1}: {labels[top5_idx[i]].lower()} ({top5_prob[i].item():.1%})")
+            debug_info.append(f"Prediction {i+1}: {labels[top5_idx[i]].lower()} ({top5_prob[i]:.1%})")
         
         # Get insurance-specific settings
         insurance_type = insurance_type.lower()
         config = INSURANCE_CONFIG.get(insurance_type, {})
-        relevant_keywords = config.get("keywords", [])
+        if insurance_type in prediction["relevance"]:
+            mass = prediction["relevance"][insurance_type]["mass"]
+            debug_info.append(f"Probability on {insurance_type} labels: {mass:.1%}")
         
         # Check for relevant image content
-        is_relevant = False
-        confidence = 0.0
-        top_label = ""
-        
-        for i in range(5):
-            pred_label = labels[top5_idx[i]].lower()
-            pred_conf = top5_prob[i].item()
-            
-            if any(keyword in pred_label for keyword in relevant_keywords):
-                is_relevant = True
-                confidence = max(confidence, pred_conf)
-                top_label = pred_label
-                break
+        is_relevant, confidence, top_label = find_relevant_label(prediction, insurance_type)
         
         if not is_relevant:
             return "⚠️ Image doesn't match the insurance type. Please upload a relevant image.", debug_info